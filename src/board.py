@@ -1,16 +1,38 @@
-import os
-from operator import is_
 from uuid import uuid4
 
-import numpy as np
-
-from pieces import Bishop, King, Knight, Pawn, Piece, Queen, Rook
+from kernels import (
+    bishop_moves,
+    heuristic_balance,
+    king_legal_moves,
+    king_moves,
+    knight_moves,
+    pawn_moves,
+    pin_masks,
+    queen_moves,
+    rook_moves,
+    square_attacked,
+)
+from pieces import (
+    CELLS,
+    PIECE_CHARACTERS,
+    PIECE_TYPES,
+    PIECE_VALUES,
+    ZOBRIST,
+    Bishop,
+    King,
+    Knight,
+    Pawn,
+    Queen,
+    Rook,
+)
 from util import (
     InvalidColumnException,
     InvalidRowException,
-    map_piece_to_character,
 )
 
+# Piece class for every upper case piece character of a stored configuration
+PIECE_CODES = {"P": Pawn, "R": Rook, "N": Knight, "B": Bishop, "Q": Queen, "K": King}
+
 
 class BoardBase:
     """
@@ -19,36 +41,73 @@ class BoardBase:
     anything in this class for any of the tasks.
     """
 
+    __slots__ = (
+        "_ascii",
+        "_pins",
+        "_pins_key",
+        "bb",
+        "black_pieces",
+        "cells",
+        "kings",
+        "occ_black",
+        "occ_white",
+        "occupancy",
+        "white_pieces",
+        "zkey",
+    )
+
     def __init__(self):
         """Constructor.
         Start with empty cells
         """
-        self.cells = [[None for _ in range(8)] for _ in range(8)]
-        self.check_cache = {}
+        # Piece (or None) of every cell, flat and indexed by square ``row * 8 + col``
+        self.cells = [None] * 64
+
+        # Result of pin_masks for the position with the Zobrist key in _pins_key,
+        # indexed by color. Moves of all pieces of a color in one position are
+        # checked against the same masks, so they are worked out once.
+        self._pins_key = [None, None]
+        self._pins = [None, None]
+
+        # One bitboard per (piece kind, color), indexed as ``KIND * 2 + white``: bit
+        # ``row * 8 + col`` is set if such a piece stands on that cell.
+        # ``cells`` keeps the piece objects.
+        self.bb = [0] * (2 * len(PIECE_TYPES))
+        self.occ_white = 0
+        self.occ_black = 0
+        self.occupancy = 0
+
+        # Zobrist key of the current position, updated incrementally in set_cell
+        self.zkey = 0
+
+        # Pieces currently on the board, per color. set_cell adds pieces entering
+        # the board and removes pieces that are hit or cleared, moves keep them.
+        self.white_pieces = []
+        self.black_pieces = []
+
+        # Direct references to the kings, indexed by color (False: black, True: white)
+        self.kings = [None, None]
+
+        # Board character of every cell as ASCII byte, indexed by square, kept
+        # up to date by set_cell so printing does not need to look at the pieces
+        self._ascii = bytearray(b"." * 64)
 
     def __str__(self):
         """
         Returns a nice printable (on console) representation for the current board configuration.
         This is an extended form, meant for readability on console output.
         """
+        chars = self._ascii.decode()
         return "\n".join(
-            [
-                " ".join([map_piece_to_character(cell) for cell in row])
-                for row in reversed(self.cells)
-            ]
+            [" ".join(chars[row * 8 : row * 8 + 8]) for row in range(7, -1, -1)]
         )
 
     def hash(self):
         """
-        Returns a unique hash (string) representation for the current board configuration.
-        This is short form, not meant for readability.
+        Returns a 64-bit Zobrist hash (int) for the current board configuration.
+        It is maintained incrementally by set_cell, so calling this is O(1).
         """
-        return "".join(
-            [
-                "".join([map_piece_to_character(cell) for cell in row])
-                for row in reversed(self.cells)
-            ]
-        )
+        return self.zkey
 
     def save_to_disk(self, fname=None):
         """
@@ -69,7 +128,20 @@ class BoardBase:
         """
         Clears to board, deleting all pieces currently placed on it
         """
-        self.cells = [[None for _ in range(8)] for _ in range(8)]
+        # Reuse the existing lists instead of allocating new ones
+        self.cells[:] = [None] * 64
+
+        self.bb[:] = [0] * (2 * len(PIECE_TYPES))
+
+        self.occ_white = 0
+        self.occ_black = 0
+        self.occupancy = 0
+        self.zkey = 0
+
+        self.white_pieces.clear()
+        self.black_pieces.clear()
+        self.kings[:] = [None, None]
+        self._ascii[:] = b"." * 64
 
     def load_from_memory(self, configString):
         """
@@ -77,7 +149,7 @@ class BoardBase:
 
         :param name: Filename to use.
         """
-        self.cells = [[None for _ in range(8)] for _ in range(8)]
+        self.clear_board()
 
         for row, line in enumerate(configString.splitlines()):
             line = line.strip()
@@ -89,27 +161,10 @@ class BoardBase:
                 if pieceCode == ".":
                     continue
 
-                if pieceCode.isupper():
-                    white = True
-                else:
-                    white = False
-
-                pieceCode = pieceCode.upper()
-
-                if pieceCode == "P":
-                    piece = Pawn(self, white)
-                if pieceCode == "K":
-                    piece = King(self, white)
-                if pieceCode == "Q":
-                    piece = Queen(self, white)
-                if pieceCode == "N":
-                    piece = Knight(self, white)
-                if pieceCode == "B":
-                    piece = Bishop(self, white)
-                if pieceCode == "R":
-                    piece = Rook(self, white)
+                white = pieceCode.isupper()
+                piece = PIECE_CODES[pieceCode.upper()](self, white)
 
-                self.set_cell(np.array([7 - row, col]), piece)
+                self.set_cell((7 - row, col), piece)
 
     def load_from_disk(self, fname):
         """
@@ -121,21 +176,32 @@ class BoardBase:
         with open(fname, "rt") as f:
             self.load_from_memory(f.read())
 
-    def is_king_check_cached(self, white):
-        """
-        Calls is_king_check for board configurations not yet known. Caches the result for later look-up.
-        """
-        # Calculate hash and see if current position is in the cache
-        hash = self.hash() + ("-w" if white else "-b")
-        if hash in self.check_cache:
-            return self.check_cache[hash]
-
-        # No, so evaluate it
-        value = self.is_king_check(white)
-
-        # Cache it for later
-        self.check_cache[hash] = value
-        return value
+    def pin_masks_cached(self, white):
+        """
+        Returns check mask, pinned pieces and pin rays of the given color as computed by
+        :py:func:`pin_masks <kernels.pin_masks>`. Must only be called with a king of that color on the board.
+        The result is kept until the position changes.
+        """
+        if self._pins_key[white] == self.zkey:
+            return self._pins[white]
+
+        bb = self.bb
+        them = not white
+        queens = bb[Queen.KIND * 2 + them]
+        pins = pin_masks(
+            self.kings[white].sq,
+            white,
+            self.occupancy,
+            self.occ_white if white else self.occ_black,
+            bb[Pawn.KIND * 2 + them],
+            bb[Knight.KIND * 2 + them],
+            bb[Bishop.KIND * 2 + them] | queens,
+            bb[Rook.KIND * 2 + them] | queens,
+            bb[King.KIND * 2 + them],
+        )
+        self._pins_key[white] = self.zkey
+        self._pins[white] = pins
+        return pins
 
     def get_cell(self, cell):
         """
@@ -149,7 +215,7 @@ class BoardBase:
         row, col = cell
 
         # Return the piece on the cell
-        return self.cells[row][col]
+        return self.cells[row * 8 + col]
 
     def set_cell(self, cell, piece):
         """
@@ -165,55 +231,108 @@ class BoardBase:
         if col < 0 or col >= 8:
             raise InvalidColumnException((row, col))
 
+        sq = row * 8 + col
+        bit = 1 << sq
+        cells = self.cells
+
+        previous = cells[sq]
+        if previous is piece:
+            return
+
+        # Whatever stood on the target cell so far leaves the board
+        if previous is not None:
+            key = previous.KIND * 2 + previous.white
+            self.bb[key] &= ~bit
+            self.zkey ^= ZOBRIST[key][sq]
+            if previous.white:
+                self.occ_white &= ~bit
+                self.white_pieces.remove(previous)
+            else:
+                self.occ_black &= ~bit
+                self.black_pieces.remove(previous)
+            if self.kings[previous.white] is previous:
+                self.kings[previous.white] = None
+            self._ascii[sq] = 46  # "."
+
         # If there is a piece to place, there is maintenance stuff to do
         if piece is not None:
-            # If the piece has a cell (so it was placed on the board already), set that cell to None
-            if piece.cell is not None:
-                self.set_cell(piece.cell, None)
+            key = piece.KIND * 2 + piece.white
+            old_sq = piece.sq
+
+            # If the piece is placed on the board already, lift it from its old cell.
+            # Otherwise it joins the pieces of its color.
+            if old_sq is not None and cells[old_sq] is piece:
+                old_bit = 1 << old_sq
+                cells[old_sq] = None
+                self._ascii[old_sq] = 46  # "."
+                self.bb[key] &= ~old_bit
+                self.zkey ^= ZOBRIST[key][old_sq]
+                if piece.white:
+                    self.occ_white &= ~old_bit
+                else:
+                    self.occ_black &= ~old_bit
+            else:
+                if piece.white:
+                    self.white_pieces.append(piece)
+                else:
+                    self.black_pieces.append(piece)
+                if piece.KIND == King.KIND:
+                    self.kings[piece.white] = piece
+
+            # Update the pieces cell, both as (row, col) tuple and as square index
+            piece.cell = CELLS[sq]
+            piece.sq = sq
+
+            self.bb[key] |= bit
+            self.zkey ^= ZOBRIST[key][sq]
+            self._ascii[sq] = PIECE_CHARACTERS[key]
+            if piece.white:
+                self.occ_white |= bit
+            else:
+                self.occ_black |= bit
 
-            # Update the pieces cell
-            piece.cell = np.array([row, col])
+        self.occupancy = self.occ_white | self.occ_black
 
         # Update the cell on the board
-        self.cells[row][col] = piece
+        cells[sq] = piece
 
     def reset(self):
         """
         Resets the board to its default (start) configuration
         """
         # Start with all empty cells
-        self.cells = [[None for _ in range(8)] for _ in range(8)]
+        self.clear_board()
 
         # Pawns
         for col in range(8):
-            self.set_cell(np.array([1, col]), Pawn(self, True))
-            self.set_cell(np.array([6, col]), Pawn(self, False))
+            self.set_cell((1, col), Pawn(self, True))
+            self.set_cell((6, col), Pawn(self, False))
 
         # Rooks
-        self.set_cell(np.array([0, 0]), Rook(self, True))
-        self.set_cell(np.array([0, 7]), Rook(self, True))
-        self.set_cell(np.array([7, 0]), Rook(self, False))
-        self.set_cell(np.array([7, 7]), Rook(self, False))
+        self.set_cell((0, 0), Rook(self, True))
+        self.set_cell((0, 7), Rook(self, True))
+        self.set_cell((7, 0), Rook(self, False))
+        self.set_cell((7, 7), Rook(self, False))
 
         # Knights
-        self.set_cell(np.array([0, 1]), Knight(self, True))
-        self.set_cell(np.array([0, 6]), Knight(self, True))
-        self.set_cell(np.array([7, 1]), Knight(self, False))
-        self.set_cell(np.array([7, 6]), Knight(self, False))
+        self.set_cell((0, 1), Knight(self, True))
+        self.set_cell((0, 6), Knight(self, True))
+        self.set_cell((7, 1), Knight(self, False))
+        self.set_cell((7, 6), Knight(self, False))
 
         # Bishops
-        self.set_cell(np.array([0, 2]), Bishop(self, True))
-        self.set_cell(np.array([0, 5]), Bishop(self, True))
-        self.set_cell(np.array([7, 2]), Bishop(self, False))
-        self.set_cell(np.array([7, 5]), Bishop(self, False))
+        self.set_cell((0, 2), Bishop(self, True))
+        self.set_cell((0, 5), Bishop(self, True))
+        self.set_cell((7, 2), Bishop(self, False))
+        self.set_cell((7, 5), Bishop(self, False))
 
         # Queen
-        self.set_cell(np.array([0, 3]), Queen(self, True))
-        self.set_cell(np.array([7, 3]), Queen(self, False))
+        self.set_cell((0, 3), Queen(self, True))
+        self.set_cell((7, 3), Queen(self, False))
 
         # King
-        self.set_cell(np.array([0, 4]), King(self, True))
-        self.set_cell(np.array([7, 4]), King(self, False))
+        self.set_cell((0, 4), King(self, True))
+        self.set_cell((7, 4), King(self, False))
 
         # self.save_to_disk()
 
@@ -225,6 +344,8 @@ class Board(BoardBase):
     **HINT**: Read the documentation carefully. Also look at the parent class (BoardBase) for further reference and example implementations.
     """
 
+    __slots__ = ()
+
     def __init__(self):
         """
         Constructor, currently does nothing but calling the super constructor.
@@ -234,21 +355,94 @@ class Board(BoardBase):
 
     def iterate_cells_with_pieces(self, white):
         """
-        Iterate over all board cells that contain a piece of the given color.
+        Return all pieces of the given color currently placed on the board.
 
-        This method is a generator. It goes through the board row by row and
-        yields each cell that contains a piece matching the given color.
+        The board keeps one list of pieces per color up to date in set_cell, so
+        this only hands out that list, no cells need to be scanned. Pieces are
+        neither added nor removed by plain moves, but hitting a piece and undoing
+        the move places the hit piece at the end of its list again.
 
         Args:
             white (bool): True to iterate over white pieces, False for black pieces.
 
-        Yields:
-            Cell: A cell containing a piece of the specified color.
+        Returns:
+            list: The pieces of the specified color.
+        """
+        return self.white_pieces if white else self.black_pieces
+
+    def valid_moves(self, white):
+        """
+        Returns the valid cells of all pieces of the given color as list of (piece, bitboard) pairs, in the
+        order of :py:meth:`iterate_cells_with_pieces`. Each bitboard equals :py:meth:`get_valid_bb <pieces.Piece.get_valid_bb>`
+        of its piece, but all of them are generated in one pass: the check and pin masks are looked up
+        once and applied right away, without going through the methods of every piece.
+        """
+        occupancy = self.occupancy
+        if white:
+            pieces, own, enemy = self.white_pieces, self.occ_white, self.occ_black
+        else:
+            pieces, own, enemy = self.black_pieces, self.occ_black, self.occ_white
+
+        # Without a king, there is no check to avoid
+        king = self.kings[white]
+        if king is None:
+            check_mask, pinned, pin_rays = -1, 0, None
+        else:
+            check_mask, pinned, pin_rays = self.pin_masks_cached(white)
+
+        moves = []
+        for piece in pieces:
+            sq = piece.sq
+            kind = piece.KIND
+            if kind == Pawn.KIND:
+                targets = pawn_moves(sq, white, occupancy, enemy)
+            elif kind == Knight.KIND:
+                targets = knight_moves(sq, own)
+            elif kind == Bishop.KIND:
+                targets = bishop_moves(sq, occupancy, own)
+            elif kind == Rook.KIND:
+                targets = rook_moves(sq, occupancy, own)
+            elif kind == Queen.KIND:
+                targets = queen_moves(sq, occupancy, own)
+            else:
+                targets = king_moves(sq, own)
+
+                # The King must not step onto an attacked cell
+                if piece is king:
+                    bb = self.bb
+                    them = not white
+                    queens = bb[Queen.KIND * 2 + them]
+                    moves.append(
+                        (
+                            piece,
+                            king_legal_moves(
+                                targets,
+                                sq,
+                                white,
+                                occupancy,
+                                bb[Pawn.KIND * 2 + them],
+                                bb[Knight.KIND * 2 + them],
+                                bb[Bishop.KIND * 2 + them] | queens,
+                                bb[Rook.KIND * 2 + them] | queens,
+                                bb[King.KIND * 2 + them],
+                            ),
+                        )
+                    )
+                    continue
+
+            # Any other piece must resolve a check and stay on its pin ray, if pinned
+            targets &= check_mask
+            if pinned >> sq & 1:
+                targets &= pin_rays[sq]
+            moves.append((piece, targets))
+
+        return moves
+
+    def own_occ(self, white):
+        """
+        Returns the occupancy bitboard of all pieces of the given color.
         """
-        for row in self.cells:
-            for cell in row:
-                if cell is not None and cell.white == white:
-                    yield cell
+        return self.occ_white if white else self.occ_black
 
     def find_king(self, white):
         """
@@ -262,11 +456,8 @@ class Board(BoardBase):
 
         :return: The :py:class:'King': object of the given color or None if there is no King on the board.
         """
-        for piece in self.iterate_cells_with_pieces(white):
-            if type(piece).__name__ == "King":
-                return piece
-
-        return None
+        # set_cell keeps a direct reference to each king, no search needed
+        return self.kings[white]
 
     def is_king_check(self, white):
         """
@@ -278,21 +469,27 @@ class Board(BoardBase):
         For each opposing piece, call the "get_reachable_cells()" method to get a list of all reachable cells.
         Iterate over each reachable cell and check if the kings cell is reachable. If yes, shortcut and return True right away.
         """
-        king = self.find_king(white=white)
+        king = self.kings[white]
 
         if king is None:
             return False
 
-        king_cell = king.cell
-
-        for opposing_piece in self.iterate_cells_with_pieces(white=not white):
-            reachable_cells = opposing_piece.get_reachable_cells()
-
-            for reachable_cell in reachable_cells:
-                if np.array_equal(reachable_cell, king_cell):
-                    return True
-
-        return False
+        # Instead of generating the moves of every opposing piece, look from the kings
+        # cell: a piece attacks the king if the king, moving like that piece, could hit it.
+        bb = self.bb
+        them = not white
+        queens = bb[Queen.KIND * 2 + them]
+        return square_attacked(
+            king.sq,
+            white,
+            self.occupancy,
+            0,
+            bb[Pawn.KIND * 2 + them],
+            bb[Knight.KIND * 2 + them],
+            bb[Bishop.KIND * 2 + them] | queens,
+            bb[Rook.KIND * 2 + them] | queens,
+            bb[King.KIND * 2 + them],
+        )
 
     def evaluate(self, use_heuristics=False):
         """
@@ -304,15 +501,29 @@ class Board(BoardBase):
         Use the iterate_cells_with_pieces Method to find all WHITE pieces and call their respective "evaluate" Method. Sum those scores up.
         Then use the iterate_cells_with_pieces Method to find all BLACK pieces, call their respective "evaluate" Method and substract that from the score.
         """
-        score = 0.0
-
-        for piece in self.iterate_cells_with_pieces(white=True):
-            score += piece.evaluate(use_heuristics=use_heuristics)
-
-        for piece in self.iterate_cells_with_pieces(white=False):
-            score -= piece.evaluate(use_heuristics=use_heuristics)
-
-        return score
+        score = 0
+
+        # Material only depends on how many pieces of each kind there are, which the
+        # bitboards answer with one population count per kind and color. Piece values
+        # are integers, so the material score is exact.
+        bb = self.bb
+        for kind, value in enumerate(PIECE_VALUES):
+            score += value * (bb[kind * 2 + 1].bit_count() - bb[kind * 2].bit_count())
+
+        if not use_heuristics:
+            return score
+
+        # Mobility, hits and center control of all pieces, generated and scored
+        # straight from the bitboards without going through the pieces
+        white_king = self.kings[True]
+        black_king = self.kings[False]
+        return score + heuristic_balance(
+            self.bb,
+            self.occ_white,
+            self.occ_black,
+            -1 if white_king is None else white_king.sq,
+            -1 if black_king is None else black_king.sq,
+        )
 
     def is_valid_cell(self, cell):
         """
@@ -327,8 +538,10 @@ class Board(BoardBase):
         if cell is None:
             return False
 
+        # Coordinates 0 to 7 have no bits above the lowest three, negative ones
+        # have all of them set, so one mask tests both bounds of both coordinates
         row, col = cell
-        return 0 <= row <= 7 and 0 <= col <= 7
+        return not (row | col) & ~7
 
     def cell_is_valid_and_empty(self, cell):
         """
@@ -342,8 +555,9 @@ class Board(BoardBase):
         if not self.is_valid_cell(cell):
             return False
 
-        # Cell is valid and empty
-        return self.get_cell(cell) is None
+        # Cell is valid and empty, no need to validate it again in get_cell
+        row, col = cell
+        return self.cells[row * 8 + col] is None
 
     def piece_can_enter_cell(self, piece, cell):
         """
@@ -367,7 +581,9 @@ class Board(BoardBase):
         if not self.is_valid_cell(cell):
             return False
 
-        target_piece = self.get_cell(cell)
+        # Cell is valid, no need to validate it again in get_cell
+        row, col = cell
+        target_piece = self.cells[row * 8 + col]
 
         # Empty cell: piece can enter
         if target_piece is None:
@@ -391,12 +607,14 @@ class Board(BoardBase):
         If, however, there is another piece, it must be of opposing color. Check the other pieces "white" attribute and compare against
         the given piece "white" attribute.
         """
-        target_piece = self.get_cell(cell=cell)
-
         # Checks if cell is valid
-        if not self.is_valid_cell(cell=cell):
+        if not self.is_valid_cell(cell):
             return False
 
+        # Cell is valid, no need to validate it again in get_cell
+        row, col = cell
+        target_piece = self.cells[row * 8 + col]
+
         # If cell is empty, piece cannot hit
         if target_piece is None:
             return False
@@ -1,9 +1,61 @@
+import heapq
+import math
 import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from operator import attrgetter
 
+from board import Board
+from pieces import CELLS, PIECE_VALUES, ZOBRIST_BLACK_TO_MOVE, King
 from util import cell_to_string, map_piece_to_character
 
 DEPTH = 3
 
+# Score of a won game, from whites perspective. Given when the opponent has no
+# moves left or its king is hit.
+WIN_SCORE = 10**9
+
+# Number of moves evaluate_all_possible_moves returns by default, and the
+# number of moves minMax searches in every position
+MAXIMUM_NUMBER_OF_MOVES = 10
+
+# Whether the leaves of the search play out pending hits (see quiescence)
+# instead of taking the static evaluation after the last move
+QUIESCENCE = True
+
+# Number of processes searching the moves at the root in parallel. With less
+# than two, suggest_move searches serially. Off by default: handing positions
+# to other processes only pays off for searches deeper than the default DEPTH.
+ROOT_WORKERS = 0
+
+# Pool of the root workers, started on first use and kept between moves
+_pool = None
+
+# Quiet moves that recently caused a cutoff, two slots per remaining depth.
+# A move is stored as from_square * 64 + to_square.
+_killers = {}
+_NO_KILLERS = (None, None)
+
+# Cutoffs caused by quiet moves, indexed by (KIND * 2 + white) * 64 + to_square
+# like the bitboards. Deeper cutoffs count more.
+_history = [0] * (12 * 64)
+
+# Order ranks of quiet moves, below every hit (the lowest hit rank is a king
+# taking a pawn, -990). Killers come first, then the others by their history.
+KILLER_ORDER = -1e6
+QUIET_ORDER = -1e9
+
+# Sort keys for moves, attrgetter runs in C instead of calling a lambda per move
+_score = attrgetter("score")
+_order = attrgetter("order")
+
+
+def _after_killers(move):
+    """
+    Sort key putting hits and killers ahead of the other quiet moves.
+    """
+    return move.order < KILLER_ORDER - 1
+
 
 class MinMaxArg:
     """Helper Class for the MinMax Algorithm.
@@ -12,18 +64,31 @@ class MinMaxArg:
     Note: You don´t need to implement anything in this case, you can use it in the MinMax Algorithm as you seem fit.
     """
 
-    def __init__(self, depth=DEPTH, playAsWhite=True):
+    # Every searched position creates one, keep it as small as Move
+    __slots__ = ("alpha", "beta", "depth", "playAsWhite")
+
+    def __init__(self, depth=DEPTH, playAsWhite=True, alpha=-math.inf, beta=math.inf):
         """
-        Initializes the class using the provided parameters
+        Initializes the class using the provided parameters.
+        alpha and beta bound the alpha-beta search window (from whites perspective):
+        alpha is the score white is already assured of, beta the score black is already assured of.
         """
         self.depth = depth
         self.playAsWhite = playAsWhite
+        self.alpha = alpha
+        self.beta = beta
 
-    def next(self):
+    def next(self, alpha=None, beta=None):
         """
-        Provides the next stage of the MinMax Algorithm by reducing the depth by one and toggling playAsWhite
+        Provides the next stage of the MinMax Algorithm by reducing the depth by one and toggling playAsWhite.
+        The search window is passed on, narrowed to alpha and beta if given.
         """
-        return MinMaxArg(self.depth - 1, not self.playAsWhite)
+        return MinMaxArg(
+            self.depth - 1,
+            not self.playAsWhite,
+            self.alpha if alpha is None else alpha,
+            self.beta if beta is None else beta,
+        )
 
 
 class Move:
@@ -34,13 +99,19 @@ class Move:
     Note: You don´t need to implement anything in this case, you can use it in the MinMax Algorithm as you seem fit.
     """
 
-    def __init__(self, piece, cell, score):
+    # One Move is created per generated move, so keep it small: no per-instance
+    # __dict__, and attribute access goes through fixed slots
+    __slots__ = ("cell", "order", "piece", "score")
+
+    def __init__(self, piece, cell, score, order=-math.inf):
         """
-        Constructor initializes the class according to the provided parameters
+        Constructor initializes the class according to the provided parameters.
+        order ranks moves of equal score for the search, higher values are tried first.
         """
         self.piece = piece
         self.cell = cell
         self.score = score
+        self.order = order
 
     def __str__(self):
         """
@@ -59,7 +130,9 @@ class Move:
         return s
 
 
-def evaluate_all_possible_moves(board, minMaxArg, maximumNumberOfMoves=10):
+def evaluate_all_possible_moves(
+    board, minMaxArg, maximumNumberOfMoves=MAXIMUM_NUMBER_OF_MOVES, static_eval=True
+):
     """
     This method must evaluate all possible moves from all pieces of the current color.
 
@@ -91,38 +164,119 @@ def evaluate_all_possible_moves(board, minMaxArg, maximumNumberOfMoves=10):
 
     After sorting, a maximum number of moves as provided by the respective parameter must be returned. If there are
     more moves possible (in most situations there are), only return the top (or worst). Hint: Slice the list after sorting.
+
+    If static_eval is False and all moves fit into maximumNumberOfMoves, no move is evaluated. The moves are then
+    returned in MVV-LVA order, followed by the quiet moves, with their score set to that rank, for callers that
+    replace the scores anyway.
+    """
+    moves = _generate_moves(board, minMaxArg.playAsWhite)
+
+    # Without a static evaluation, the moves are only ordered for the search. This
+    # is only possible if all of them are returned, otherwise the evaluation is
+    # needed to pick the best ones.
+    if not static_eval and len(moves) <= maximumNumberOfMoves:
+        return moves
+
+    return _evaluate_moves(board, moves, minMaxArg.playAsWhite, maximumNumberOfMoves)
+
+
+def _generate_moves(board, is_white):
+    """
+    Returns all valid moves of the given color in MVV-LVA order: hits on the most
+    valuable victim first, by the least valuable attacker among those. Quiet moves
+    come last. Score and order of every move are set to its rank.
     """
     moves = []
-    is_white = minMaxArg.playAsWhite
+    cells = board.cells
+
+    # Go through all pieces of the current player with their valid cells, generated
+    # for the whole side in one pass
+    for piece, valid in board.valid_moves(is_white):
+        # Try every valid target cell for this piece, walking the set bits of the
+        # valid cell bitboard lowest first
+        while valid:
+            lsb = valid & -valid
+            valid ^= lsb
+            sq = lsb.bit_length() - 1
+
+            captured_piece = cells[sq]
+            if captured_piece is None:
+                order = QUIET_ORDER
+            else:
+                order = (
+                    PIECE_VALUES[captured_piece.KIND] * 10 - PIECE_VALUES[piece.KIND]
+                )
+
+            moves.append(Move(piece, CELLS[sq], order, order))
+
+    # The selection by score in _evaluate_moves keeps this order among equal
+    # scores, so the search tries hits first, which makes alpha-beta cutoffs come earlier
+    moves.sort(key=_order, reverse=True)
+    return moves
+
+
+def _evaluate_moves(board, moves, is_white, maximumNumberOfMoves):
+    """
+    Scores the given moves with the static evaluation of the board after each of them
+    and returns the best maximumNumberOfMoves for the given color, best first.
+    Moves of equal score keep their order.
+    """
+    # Every move is made, evaluated and undone, keep the board methods at hand
+    cells = board.cells
+    set_cell = board.set_cell
+    evaluate = board.evaluate
+    for move in moves:
+        piece = move.piece
+        target_cell = move.cell
 
-    # Go through all pieces of the current player
-    for piece in board.iterate_cells_with_pieces(white=is_white):
+        # Save the cell of the piece and what is currently on the target cell (could be None)
         original_cell = piece.cell
-        valid_cells = piece.get_valid_cells()
-
-        # Try every valid target cell for this piece
-        for target_cell in valid_cells:
-            # Save what is currently on the target cell (could be None)
-            captured_piece = board.get_cell(target_cell)
+        row, col = target_cell
+        captured_piece = cells[row * 8 + col]
 
-            # Make the move on the board
-            board.set_cell(target_cell, piece)
+        # Make the move on the board
+        set_cell(target_cell, piece)
 
-            # Evaluate the board after the move
-            score = board.evaluate(use_heuristics=True)
-            moves.append(Move(piece, target_cell, score))
+        # Evaluate the board after the move
+        move.score = evaluate(True)
 
-            # Undo the move: put the piece back and restore captured piece (if any)
-            board.set_cell(original_cell, piece)
-            board.set_cell(target_cell, captured_piece)
+        # Undo the move: put the piece back and restore captured piece (if any)
+        set_cell(original_cell, piece)
+        if captured_piece is not None:
+            set_cell(target_cell, captured_piece)
 
     # Important bug fix:
     # Sort ONCE at the end (sorting inside the loop can mess up tie-order and test expectations)
-    # White wants highest score first, Black wants lowest score first
-    moves.sort(key=lambda m: m.score, reverse=is_white)
+    # White wants highest score first, Black wants lowest score first.
+    # Only the top N moves are returned, so select them with a heap of size N
+    # instead of sorting the whole list. Ties keep their order just like sort does.
+    select = heapq.nlargest if is_white else heapq.nsmallest
+    return select(maximumNumberOfMoves, moves, key=_score)
+
+
+def _rank_quiet_moves(moves, depth):
+    """
+    Sets the order of the quiet moves among the given ones from the killers of the
+    given depth and the history of the running search. Killers rank first, the
+    other quiet moves by how often they caused cutoffs.
+    """
+    killers = _killers.get(depth, _NO_KILLERS)
+    for move in moves:
+        if move.order != QUIET_ORDER:
+            continue
 
-    # Return only top N moves
-    return moves[:maximumNumberOfMoves]
+        piece = move.piece
+        row, col = move.cell
+        sq = row * 8 + col
+        killer = piece.sq * 64 + sq
+        if killer == killers[0]:
+            move.order = KILLER_ORDER
+        elif killer == killers[1]:
+            move.order = KILLER_ORDER - 1
+        else:
+            move.order = (
+                QUIET_ORDER + _history[(piece.KIND * 2 + piece.white) * 64 + sq]
+            )
 
 
 def minMax(board, minMaxArg):
@@ -191,8 +345,15 @@ def minMax(board, minMaxArg):
     :return: Return the best move to make in the current situation.
     :rtype: :py:class:`Move`
     """
-    # Get best moves for the current player (already sorted by evaluate_all_possible_moves)
-    moves = evaluate_all_possible_moves(board, minMaxArg)
+    # Get best moves for the current player, like evaluate_all_possible_moves does.
+    # Interior nodes overwrite the scores with the results of the deeper search, so
+    # the static evaluation is only needed at the leaves or to pick the best moves.
+    moves = _generate_moves(board, minMaxArg.playAsWhite)
+    evaluated = minMaxArg.depth == 1 or len(moves) > MAXIMUM_NUMBER_OF_MOVES
+    if evaluated:
+        moves = _evaluate_moves(
+            board, moves, minMaxArg.playAsWhite, MAXIMUM_NUMBER_OF_MOVES
+        )
 
     # No moves left -> current player loses
     if not moves:
@@ -200,15 +361,34 @@ def minMax(board, minMaxArg):
         # If it's WHITE's turn and no moves -> very bad for white (low score)
         # If it's BLACK's turn and no moves -> very good for white (high score)
         if minMaxArg.playAsWhite:
-            return Move(None, None, -(10**9))
+            return Move(None, None, -WIN_SCORE)
         else:
-            return Move(None, None, 10**9)
+            return Move(None, None, WIN_SCORE)
 
-    # Base case: depth == 1 means we stop searching deeper and just take best move now
-    if minMaxArg.depth == 1:
+    # Base case: depth == 1 means we stop searching deeper and just take best move now.
+    # With QUIESCENCE, pending hits after each move are still played out below.
+    if minMaxArg.depth == 1 and not QUIESCENCE:
         return moves[0]
 
-    # Recursive case: try each move, then look at the opponent's best answer
+    # Killers and history only reorder the moves searched here, the moves picked
+    # above do not depend on earlier searches. Without a static evaluation, hits
+    # come first, then killers, then the other quiet moves by their history.
+    # Otherwise hits and killers come first, right after them the quiet moves in
+    # the order of their static evaluation. The sorts are stable, so each group
+    # keeps its order.
+    _rank_quiet_moves(moves, minMaxArg.depth)
+    if not evaluated:
+        moves.sort(key=_order, reverse=True)
+    elif minMaxArg.depth in _killers:
+        moves.sort(key=_after_killers)
+
+    # Recursive case: try each move, then look at the opponent's best answer.
+    # Alpha-beta: stop as soon as the opponent has a better alternative earlier in
+    # the tree, the remaining moves could not change the outcome anymore.
+    alpha = minMaxArg.alpha
+    beta = minMaxArg.beta
+    searched = 0
+
     for move in moves:
         piece = move.piece
         target_cell = move.cell
@@ -217,28 +397,132 @@ def minMax(board, minMaxArg):
         original_cell = piece.cell
         captured_piece = board.get_cell(target_cell)
 
+        # Hitting the king wins the game, no move can be better and nothing
+        # after it needs to be searched
+        if captured_piece is not None and captured_piece.KIND == King.KIND:
+            move.score = WIN_SCORE if minMaxArg.playAsWhite else -WIN_SCORE
+            searched += 1
+            break
+
         # Do the move (temporary)
         board.set_cell(target_cell, piece)
 
-        # Ask minimax for the opponent's best response
-        next_arg = minMaxArg.next()
-        reply_best_move = minMax_cached(board, next_arg)
+        if minMaxArg.depth == 1:
+            # At the leaves, the static evaluation of the move stands unless the
+            # opponent can start an exchange
+            move.score = quiescence(
+                board, alpha, beta, not minMaxArg.playAsWhite, move.score
+            )
+        else:
+            # Ask minimax for the opponent's best response within the current window
+            next_arg = minMaxArg.next(alpha, beta)
+            reply_best_move = minMax_cached(board, next_arg)
 
-        # Use the resulting score for this move
-        move.score = reply_best_move.score
+            # Use the resulting score for this move
+            move.score = reply_best_move.score
+        searched += 1
 
         # Restore board state (very important!)
         board.set_cell(original_cell, piece)
         board.set_cell(target_cell, captured_piece)
 
-    # Sort again based on the updated scores
+        # White raises the lower bound, black lowers the upper bound
+        if minMaxArg.playAsWhite:
+            alpha = max(alpha, move.score)
+        else:
+            beta = min(beta, move.score)
+
+        if alpha >= beta:
+            # Remember quiet moves causing a cutoff, they are tried early in
+            # sibling positions at the same depth
+            if captured_piece is None:
+                row, col = target_cell
+                depth = minMaxArg.depth
+                killer = piece.sq * 64 + row * 8 + col
+                killers = _killers.setdefault(depth, [None, None])
+                if killers[0] != killer:
+                    killers[1] = killers[0]
+                    killers[0] = killer
+                _history[(piece.KIND * 2 + piece.white) * 64 + row * 8 + col] += (
+                    depth * depth
+                )
+            break
+
+    # Sort the searched moves based on the updated scores, moves skipped by a
+    # cutoff still carry their static evaluation and must not compete.
     # White wants HIGH score, black wants LOW score (from white perspective)
-    moves.sort(key=lambda m: m.score, reverse=minMaxArg.playAsWhite)
+    moves = moves[:searched]
+    moves.sort(key=_score, reverse=minMaxArg.playAsWhite)
 
     # Return best move after sorting
     return moves[0]
 
 
+def quiescence(board, alpha, beta, playAsWhite, stand_pat=None):
+    """
+    Plays out the hits of a position until it is quiet, so a leaf is not scored in
+    the middle of an exchange. The side to move may also stand pat, i.e. keep the
+    static evaluation instead of hitting. Like minMax, scores are from whites
+    perspective and alpha and beta bound the search window.
+
+    stand_pat is the static evaluation of the position if already known.
+    """
+    if stand_pat is None:
+        stand_pat = board.evaluate(True)
+
+    # Standing pat is always possible, so it bounds the score already
+    if playAsWhite:
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+    else:
+        if stand_pat <= alpha:
+            return stand_pat
+        beta = min(beta, stand_pat)
+
+    # Only hits are searched, most valuable victim by least valuable attacker first
+    hits = []
+    cells = board.cells
+    enemy = board.own_occ(not playAsWhite)
+    for piece, valid in board.valid_moves(playAsWhite):
+        valid &= enemy
+        while valid:
+            lsb = valid & -valid
+            valid ^= lsb
+            sq = lsb.bit_length() - 1
+            order = PIECE_VALUES[cells[sq].KIND] * 10 - PIECE_VALUES[piece.KIND]
+            hits.append(Move(piece, CELLS[sq], stand_pat, order))
+    hits.sort(key=_order, reverse=True)
+
+    best = stand_pat
+    for move in hits:
+        piece = move.piece
+        target_cell = move.cell
+        original_cell = piece.cell
+        captured_piece = board.get_cell(target_cell)
+
+        # Hitting the king ends the game, hits are ordered so it comes first
+        if captured_piece.KIND == King.KIND:
+            return WIN_SCORE if playAsWhite else -WIN_SCORE
+
+        board.set_cell(target_cell, piece)
+        score = quiescence(board, alpha, beta, not playAsWhite)
+        board.set_cell(original_cell, piece)
+        board.set_cell(target_cell, captured_piece)
+
+        if playAsWhite:
+            best = max(best, score)
+            alpha = max(alpha, score)
+        else:
+            best = min(best, score)
+            beta = min(beta, score)
+
+        if alpha >= beta:
+            break
+
+    return best
+
+
 def suggest_random_move(board):
     """
     Pick a random legal move for White.
@@ -252,31 +536,150 @@ def suggest_random_move(board):
 
     If there are no legal moves at all, return None.
     """
-    white_pieces = list(board.iterate_cells_with_pieces(white=True))
+    # Reservoir sampling: the n-th legal move replaces the chosen one with
+    # probability 1/n, which picks every move with the same probability without
+    # collecting all of them first
+    count = 0
+    chosen = None
+
+    for piece, valid in board.valid_moves(True):
+        while valid:
+            lsb = valid & -valid
+            valid ^= lsb
+            count += 1
+            if random.random() * count < 1:
+                chosen = (piece, CELLS[lsb.bit_length() - 1])
+
+    if chosen is None:
+        return None
 
-    all_possible_moves = []
+    return Move(chosen[0], chosen[1], 0.0)
 
-    for piece in white_pieces:
-        valid_cells = piece.get_valid_cells()
-        for cell in valid_cells:
-            move = Move(piece, cell, 0.0)
-            all_possible_moves.append(move)
 
-    if not all_possible_moves:
-        return None
+def _reset_search_tables():
+    """
+    Clears the tables only reused within one search: killers and history.
+    """
+    _killers.clear()
+    _history[:] = [0] * len(_history)
+
+
+def _search_root_move(config, from_cell, target_cell, minMaxArg):
+    """
+    Worker side of the parallel root search. Rebuilds the board from its string
+    form, makes the given move and returns the score of the answer searched with
+    the given minMaxArg.
+    """
+    board = Board()
+    board.load_from_memory(config)
+    board.set_cell(target_cell, board.get_cell(from_cell))
+
+    _reset_search_tables()
+    return minMax_cached(board, minMaxArg).score
+
+
+def _suggest_move_parallel(board, minMaxArg):
+    """
+    Searches the root moves in ROOT_WORKERS processes. The first move is searched
+    here first, so its score narrows the window the other moves are searched with
+    (young brothers wait). The remaining moves are independent then.
+    """
+    global _pool
 
-    return random.choice(all_possible_moves)
+    moves = evaluate_all_possible_moves(board, minMaxArg, static_eval=False)
+    if not moves:
+        return minMax(board, minMaxArg)
+
+    # Hitting the king wins the game, like in minMax no move after it is searched.
+    # The workers never get a position without a king this way.
+    searched = moves
+    for index, move in enumerate(moves):
+        captured_piece = board.get_cell(move.cell)
+        if captured_piece is not None and captured_piece.KIND == King.KIND:
+            move.score = WIN_SCORE if minMaxArg.playAsWhite else -WIN_SCORE
+            if index == 0:
+                return move
+            moves = moves[: index + 1]
+            searched = moves[:index]
+            break
+
+    # Search the eldest brother here, exactly like minMax does
+    first = moves[0]
+    piece = first.piece
+    original_cell = piece.cell
+    captured_piece = board.get_cell(first.cell)
+    board.set_cell(first.cell, piece)
+    first.score = minMax_cached(board, minMaxArg.next()).score
+    board.set_cell(original_cell, piece)
+    board.set_cell(first.cell, captured_piece)
+
+    if minMaxArg.playAsWhite:
+        next_arg = minMaxArg.next(alpha=max(minMaxArg.alpha, first.score))
+    else:
+        next_arg = minMaxArg.next(beta=min(minMaxArg.beta, first.score))
+
+    if _pool is None:
+        _pool = ProcessPoolExecutor(ROOT_WORKERS)
+
+    # Workers get the board as string, which is far smaller than the pickled board
+    config = str(board)
+    searches = [
+        (
+            move,
+            _pool.submit(
+                _search_root_move, config, move.piece.cell, move.cell, next_arg
+            ),
+        )
+        for move in searched[1:]
+    ]
+    for move, future in searches:
+        move.score = future.result()
+
+    # Sorting is stable, so among equal scores the earlier move wins like in minMax
+    moves.sort(key=_score, reverse=minMaxArg.playAsWhite)
+    return moves[0]
 
 
 def suggest_move(board):
     """
     Helper function to start the mini-max algorithm.
     """
-    return minMax_cached(board, MinMaxArg())
+    _reset_search_tables()
+
+    minMaxArg = MinMaxArg()
+    if ROOT_WORKERS >= 2 and minMaxArg.depth > 1:
+        return _suggest_move_parallel(board, minMaxArg)
+    return minMax_cached(board, minMaxArg)
+
+
+# Number of slots of the transposition table of minMax_cached, must be a power of two
+EVAL_CACHE_SIZE = 1 << 18
+
+# What a stored score means: the exact score, or only a lower or upper bound
+# of it, when alpha-beta cut the search short
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Square stored for the piece of a result without a move
+NO_SQUARE = 64
+
+# Fixed-size transposition table, indexed by the low bits of the key of a position.
+# A slot holds the key, the score and the packed data of the result:
+# bits 0-5 target square, bits 6-12 square of the piece, bits 13-14 the kind
+# of score, the depth above that. As the depth is at least one, zero data
+# marks an empty slot. Colliding positions simply replace each other.
+_tt_keys = array("Q", bytes(8 * EVAL_CACHE_SIZE))
+_tt_scores = array("d", bytes(8 * EVAL_CACHE_SIZE))
+_tt_data = array("Q", bytes(8 * EVAL_CACHE_SIZE))
+total_hits = 0
 
 
-eval_cache = {}
-total_hits = 0
+def clear_eval_cache():
+    """
+    Empties the transposition table of minMax_cached.
+    """
+    _tt_data[:] = array("Q", bytes(8 * EVAL_CACHE_SIZE))
 
 
 def minMax_cached(board, minMaxArg):
@@ -287,20 +690,56 @@ def minMax_cached(board, minMaxArg):
     the mini-max algorithm again. This can save computation time as
     it avoid to repeat evaluations over and over again.
     """
-    global eval_cache, total_hits
-
-    # Calculate a unique hash code for the current board position and search depth
-    hash = str(minMaxArg.depth) + board.hash()
-    if hash in eval_cache:
-        total_hits += 1
-        print(
-            f"Cache hit! Cache has {len(eval_cache.keys())} entries with {total_hits} hits so far"
-        )
-        return eval_cache[hash]
+    global total_hits
+
+    # The Zobrist key of the position and whose turn it is. The depth is kept in
+    # the slot: a result searched at least as deep answers the search as well.
+    key = board.zkey
+    if not minMaxArg.playAsWhite:
+        key ^= ZOBRIST_BLACK_TO_MOVE
+    index = key & (EVAL_CACHE_SIZE - 1)
+    depth = minMaxArg.depth
+    alpha = minMaxArg.alpha
+    beta = minMaxArg.beta
+
+    data = _tt_data[index]
+    if data >> 15 >= depth and _tt_keys[index] == key:
+        # A bound only answers the search if it lies outside of the window
+        score = _tt_scores[index]
+        kind = data >> 13 & 3
+        if (
+            kind == EXACT
+            or (kind == LOWER_BOUND and score >= beta)
+            or (kind == UPPER_BOUND and score <= alpha)
+        ):
+            total_hits += 1
+
+            from_sq = data >> 6 & 127
+            if from_sq == NO_SQUARE:
+                return Move(None, None, score)
+            to_sq = data & 63
+            return Move(board.cells[from_sq], (to_sq >> 3, to_sq & 7), score)
 
     # Its not the cache so do the actual evaluation
     bestMove = minMax(board, minMaxArg)
 
-    # Cache it for later
-    eval_cache[hash] = bestMove
+    # A score outside of the window is only a bound of the real score
+    score = bestMove.score
+    if score <= alpha:
+        kind = UPPER_BOUND
+    elif score >= beta:
+        kind = LOWER_BOUND
+    else:
+        kind = EXACT
+
+    if bestMove.piece is None:
+        move_data = NO_SQUARE << 6
+    else:
+        row, col = bestMove.cell
+        move_data = bestMove.piece.sq << 6 | row * 8 + col
+
+    # Cache it for later, replacing whatever used the slot before
+    _tt_keys[index] = key
+    _tt_scores[index] = score
+    _tt_data[index] = depth << 15 | kind << 13 | move_data
     return bestMove
@@ -0,0 +1,588 @@
+from magics import (
+    BISHOP_DIRECTIONS,
+    BISHOP_MAGIC,
+    BISHOP_MASK,
+    BISHOP_RAYS,
+    BISHOP_SHIFT,
+    BISHOP_TABLE,
+    ROOK_DIRECTIONS,
+    ROOK_MAGIC,
+    ROOK_MASK,
+    ROOK_RAYS,
+    ROOK_SHIFT,
+    ROOK_TABLE,
+    build_lookup,
+)
+
+# Piece kinds, the KIND of the piece classes. The bitboard of the pieces of a kind
+# and color is at index KIND * 2 + white.
+PAWN = 0
+ROOK = 1
+KNIGHT = 2
+BISHOP = 3
+QUEEN = 4
+KING = 5
+KINDS = (PAWN, ROOK, KNIGHT, BISHOP, QUEEN, KING)
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, the plain Python kernels are used then
+    njit = None
+
+
+def _build_attack_table(offsets):
+    """
+    Precomputes, for every square, the bitboard of cells reachable with one of the given (row, col) offsets.
+    Offsets leaving the board are dropped, so the table already encodes the board edges.
+    """
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        attacks = 0
+        for direction_row, direction_col in offsets:
+            target_row = row + direction_row
+            target_col = col + direction_col
+            if 0 <= target_row < 8 and 0 <= target_col < 8:
+                attacks |= 1 << (target_row * 8 + target_col)
+        table.append(attacks)
+    return table
+
+
+def _build_between_table():
+    """
+    Precomputes, for every pair of squares on a common line, the bitboard of the cells strictly between them.
+    Squares not sharing a row, column or diagonal have nothing between them.
+    """
+    table = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        for direction_row, direction_col in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            between = 0
+            target_row = row + direction_row
+            target_col = col + direction_col
+            while 0 <= target_row < 8 and 0 <= target_col < 8:
+                target = target_row * 8 + target_col
+                table[sq][target] = between
+                between |= 1 << target
+                target_row += direction_row
+                target_col += direction_col
+    return table
+
+
+# Cells between two squares, indexed as BETWEEN[sq][other]
+BETWEEN = _build_between_table()
+
+KNIGHT_ATTACKS = _build_attack_table(
+    ((-2, -1), (-2, 1), (2, -1), (2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2))
+)
+KING_ATTACKS = _build_attack_table(
+    ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+)
+# Cells a pawn hits on, indexed as PAWN_ATTACKS[white][sq]. White pawns move up the rows.
+PAWN_ATTACKS = (
+    _build_attack_table(((-1, -1), (-1, 1))),
+    _build_attack_table(((1, -1), (1, 1))),
+)
+# Single step of a pawn, indexed like PAWN_ATTACKS
+PAWN_PUSH = (_build_attack_table(((-1, 0),)), _build_attack_table(((1, 0),)))
+# Dash of two cells, only set for pawns still on their start row
+PAWN_DOUBLE = (
+    [
+        attacks if sq >> 3 == 6 else 0
+        for sq, attacks in enumerate(_build_attack_table(((-2, 0),)))
+    ],
+    [
+        attacks if sq >> 3 == 1 else 0
+        for sq, attacks in enumerate(_build_attack_table(((2, 0),)))
+    ],
+)
+
+# Cells in the middle of the board, rows and columns 2 to 5
+CENTER = 0x00003C3C3C3C0000
+
+
+def _bonus_table(bonus):
+    """
+    Sums of the given bonus, indexed by how often it is given. The bonus is
+    added up one at a time like a running score, so the result matches exactly.
+    """
+    table = [0.0]
+    for _ in range(64):
+        table.append(table[-1] + bonus)
+    return table
+
+
+# Heuristic bonus of a piece, indexed by the number of opposing pieces it can hit
+# and by the number of center cells it can enter
+ATTACK_BONUS = _bonus_table(0.10)
+CENTER_BONUS = _bonus_table(0.01)
+
+
+# Move generation kernels. Each takes a square index plus occupancy bitboards and
+# returns the bitboard of cells a piece there can enter: empty cells and cells
+# with an opposing piece, i.e. everything it attacks minus its own pieces.
+#
+# square_attacked tells whether a piece of the given color on sq is attacked by
+# the opposing pieces passed in. It looks from sq: the square is attacked if a
+# piece standing there, moving like an attacker, could hit it. Attackers on the
+# captured bitboard are ignored, which lets callers test a move before making it.
+#
+# pin_masks tells, for the king of the given color on king_sq, which moves of the
+# other pieces of that color keep the king safe. It returns a check mask, the
+# bitboard of pinned pieces and the rays the pinned pieces are bound to, indexed
+# by their square. A move of a piece that is not the king is legal if its target
+# is on the check mask and, if the piece is pinned, on its pin ray:
+# - Not in check, the check mask has all bits set.
+# - In check by one piece, a move must hit the checker or block its line.
+# - In double check, only the king can move and the check mask is empty.
+# A piece is pinned if it is the only piece between the king and an opposing
+# slider on the line of the king. It may then only move along that line.
+#
+# king_legal_moves filters the targets of the king on sq down to the cells not
+# attacked once the king stands there. The king leaves its square for that, so
+# it does not block the line of a slider attacking it.
+#
+# heuristic_value scores the valid cells of a piece: a small bonus per cell, per
+# opposing piece it can hit and per center cell it can enter.
+#
+# heuristic_balance sums heuristic_value over all pieces and returns the sum of
+# white minus the sum of black. bb holds the piece bitboards indexed as
+# KIND * 2 + white like Board.bb (pawns, rooks, knights, bishops, queens, kings),
+# a missing king has square -1. The valid cells are generated like in
+# Board.valid_moves, from the check and pin masks of each color.
+
+
+if njit is None:
+    # The numba kernels index the magic tables, they have no int dicts. Built
+    # only here, the lookups take several MB.
+    ROOK_LOOKUP = build_lookup(ROOK_MASK, ROOK_MAGIC, ROOK_SHIFT, ROOK_TABLE)
+    BISHOP_LOOKUP = build_lookup(BISHOP_MASK, BISHOP_MAGIC, BISHOP_SHIFT, BISHOP_TABLE)
+
+    def rook_moves(sq, occupancy, own):
+        return ROOK_LOOKUP[sq][occupancy & ROOK_MASK[sq]] & ~own
+
+    def bishop_moves(sq, occupancy, own):
+        return BISHOP_LOOKUP[sq][occupancy & BISHOP_MASK[sq]] & ~own
+
+    def queen_moves(sq, occupancy, own):
+        return rook_moves(sq, occupancy, own) | bishop_moves(sq, occupancy, own)
+
+    def knight_moves(sq, own):
+        return KNIGHT_ATTACKS[sq] & ~own
+
+    def king_moves(sq, own):
+        return KING_ATTACKS[sq] & ~own
+
+    def pawn_moves(sq, white, occupancy, enemy):
+        # Pawns only push onto empty cells, and dash only if the first step is free
+        pushes = PAWN_PUSH[white][sq] & ~occupancy
+        if pushes:
+            pushes |= PAWN_DOUBLE[white][sq] & ~occupancy
+        return pushes | PAWN_ATTACKS[white][sq] & enemy
+
+    def square_attacked(
+        sq, white, occupancy, captured, pawns, knights, bishops, rooks, kings
+    ):
+        alive = ~captured
+
+        # Leapers are plain table lookups, test them first
+        if (
+            KNIGHT_ATTACKS[sq] & knights & alive
+            or KING_ATTACKS[sq] & kings & alive
+            or PAWN_ATTACKS[white][sq] & pawns & alive
+        ):
+            return True
+
+        # Sliders only need the magic lookup if one of them stands on an empty-board
+        # ray of the square, which rules out most of them with a single AND
+        rooks &= alive
+        if rooks & ROOK_RAYS[sq] and rook_moves(sq, occupancy, 0) & rooks:
+            return True
+
+        bishops &= alive
+        return bool(
+            bishops & BISHOP_RAYS[sq] and bishop_moves(sq, occupancy, 0) & bishops
+        )
+
+    def pin_masks(
+        king_sq, white, occupancy, own, pawns, knights, bishops, rooks, kings
+    ):
+        between = BETWEEN[king_sq]
+        checkers = (
+            KNIGHT_ATTACKS[king_sq] & knights
+            | KING_ATTACKS[king_sq] & kings
+            | PAWN_ATTACKS[white][king_sq] & pawns
+        )
+
+        # Every slider on a line of the king either checks it, pins the single own
+        # piece in between or is blocked. A square shares a row or column with the
+        # king or a diagonal, never both, so no slider is seen twice.
+        pinned = 0
+        pin_rays = {}
+        snipers = rooks & ROOK_RAYS[king_sq] | bishops & BISHOP_RAYS[king_sq]
+        while snipers:
+            bit = snipers & -snipers
+            snipers ^= bit
+            ray = between[bit.bit_length() - 1]
+            blockers = ray & occupancy
+            if not blockers:
+                checkers |= bit
+            elif not blockers & (blockers - 1) and blockers & own:
+                pinned |= blockers
+                pin_rays[blockers.bit_length() - 1] = ray | bit
+
+        if not checkers:
+            return -1, pinned, pin_rays
+        if checkers & (checkers - 1):
+            return 0, pinned, pin_rays
+        return checkers | between[checkers.bit_length() - 1], pinned, pin_rays
+
+    def king_legal_moves(
+        targets, sq, white, occupancy, pawns, knights, bishops, rooks, kings
+    ):
+        # Test every move: the king leaves its square and takes the target
+        occupancy &= ~(1 << sq)
+        legal = targets
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            if square_attacked(
+                bit.bit_length() - 1,
+                white,
+                occupancy | bit,
+                bit,
+                pawns,
+                knights,
+                bishops,
+                rooks,
+                kings,
+            ):
+                legal ^= bit
+        return legal
+
+    def heuristic_value(valid, enemy):
+        mobility = 0.05 * valid.bit_count()
+        attack = ATTACK_BONUS[(valid & enemy).bit_count()]
+        center = CENTER_BONUS[(valid & CENTER).bit_count()]
+        return mobility + attack + center
+
+    def _side_heuristics(bb, white, king_sq, occupancy, own, enemy):
+        them = not white
+        queens = bb[QUEEN * 2 + them]
+        pawns = bb[PAWN * 2 + them]
+        knights = bb[KNIGHT * 2 + them]
+        bishops = bb[BISHOP * 2 + them] | queens
+        rooks = bb[ROOK * 2 + them] | queens
+        kings = bb[KING * 2 + them]
+        if king_sq < 0:
+            check_mask, pinned, pin_rays = -1, 0, None
+        else:
+            check_mask, pinned, pin_rays = pin_masks(
+                king_sq, white, occupancy, own, pawns, knights, bishops, rooks, kings
+            )
+
+        total = 0.0
+        for kind in KINDS:
+            pieces = bb[kind * 2 + white]
+            while pieces:
+                bit = pieces & -pieces
+                pieces ^= bit
+                sq = bit.bit_length() - 1
+                if kind == PAWN:
+                    targets = pawn_moves(sq, white, occupancy, enemy)
+                elif kind == ROOK:
+                    targets = rook_moves(sq, occupancy, own)
+                elif kind == KNIGHT:
+                    targets = knight_moves(sq, own)
+                elif kind == BISHOP:
+                    targets = bishop_moves(sq, occupancy, own)
+                elif kind == QUEEN:
+                    targets = queen_moves(sq, occupancy, own)
+                else:
+                    targets = king_moves(sq, own)
+
+                if sq == king_sq:
+                    targets = king_legal_moves(
+                        targets,
+                        sq,
+                        white,
+                        occupancy,
+                        pawns,
+                        knights,
+                        bishops,
+                        rooks,
+                        kings,
+                    )
+                else:
+                    targets &= check_mask
+                    if pinned & bit:
+                        targets &= pin_rays[sq]
+                total += heuristic_value(targets, enemy)
+        return total
+
+    def heuristic_balance(bb, occ_white, occ_black, white_king_sq, black_king_sq):
+        occupancy = occ_white | occ_black
+        return _side_heuristics(
+            bb, True, white_king_sq, occupancy, occ_white, occ_black
+        ) - _side_heuristics(bb, False, black_king_sq, occupancy, occ_black, occ_white)
+
+else:
+    import numpy as np
+
+    def _flatten(tables):
+        """
+        Concatenates per-square attack tables into one uint64 array plus per-square offsets,
+        as numba cannot index ragged lists of Python ints.
+        """
+        offsets = []
+        flat = []
+        for table in tables:
+            offsets.append(len(flat))
+            flat.extend(table)
+        return np.array(flat, dtype=np.uint64), np.array(offsets, dtype=np.uint64)
+
+    # All values are uint64, mixing in signed integers would make numba promote to float
+    _ROOK_TABLE, _ROOK_OFFSET = _flatten(ROOK_TABLE)
+    _ROOK_MASK = np.array(ROOK_MASK, dtype=np.uint64)
+    _ROOK_MAGIC = np.array(ROOK_MAGIC, dtype=np.uint64)
+    _ROOK_SHIFT = np.array(ROOK_SHIFT, dtype=np.uint64)
+    _BISHOP_TABLE, _BISHOP_OFFSET = _flatten(BISHOP_TABLE)
+    _BISHOP_MASK = np.array(BISHOP_MASK, dtype=np.uint64)
+    _BISHOP_MAGIC = np.array(BISHOP_MAGIC, dtype=np.uint64)
+    _BISHOP_SHIFT = np.array(BISHOP_SHIFT, dtype=np.uint64)
+    _KNIGHT_ATTACKS = np.array(KNIGHT_ATTACKS, dtype=np.uint64)
+    _KING_ATTACKS = np.array(KING_ATTACKS, dtype=np.uint64)
+    _PAWN_PUSH = np.array(PAWN_PUSH, dtype=np.uint64)
+    _PAWN_DOUBLE = np.array(PAWN_DOUBLE, dtype=np.uint64)
+    _PAWN_ATTACKS = np.array(PAWN_ATTACKS, dtype=np.uint64)
+    _ROOK_RAYS = np.array(ROOK_RAYS, dtype=np.uint64)
+    _BISHOP_RAYS = np.array(BISHOP_RAYS, dtype=np.uint64)
+    _BETWEEN = np.array(BETWEEN, dtype=np.uint64)
+    _CENTER = np.uint64(CENTER)
+    _ATTACK_BONUS = np.array(ATTACK_BONUS)
+    _CENTER_BONUS = np.array(CENTER_BONUS)
+    _NONE = np.uint64(0)
+    _ONE = np.uint64(1)
+
+    # The uint64 multiplication wraps around, so no MASK64 is needed here
+    @njit("uint64(int64, uint64, uint64)", cache=True)
+    def rook_moves(sq, occupancy, own):
+        index = ((occupancy & _ROOK_MASK[sq]) * _ROOK_MAGIC[sq]) >> _ROOK_SHIFT[sq]
+        return _ROOK_TABLE[_ROOK_OFFSET[sq] + index] & ~own
+
+    @njit("uint64(int64, uint64, uint64)", cache=True)
+    def bishop_moves(sq, occupancy, own):
+        index = ((occupancy & _BISHOP_MASK[sq]) * _BISHOP_MAGIC[sq]) >> _BISHOP_SHIFT[
+            sq
+        ]
+        return _BISHOP_TABLE[_BISHOP_OFFSET[sq] + index] & ~own
+
+    @njit("uint64(int64, uint64, uint64)", cache=True)
+    def queen_moves(sq, occupancy, own):
+        return rook_moves(sq, occupancy, own) | bishop_moves(sq, occupancy, own)
+
+    @njit("uint64(int64, uint64)", cache=True)
+    def knight_moves(sq, own):
+        return _KNIGHT_ATTACKS[sq] & ~own
+
+    @njit("uint64(int64, uint64)", cache=True)
+    def king_moves(sq, own):
+        return _KING_ATTACKS[sq] & ~own
+
+    @njit("uint64(int64, int64, uint64, uint64)", cache=True)
+    def pawn_moves(sq, white, occupancy, enemy):
+        pushes = _PAWN_PUSH[white, sq] & ~occupancy
+        if pushes:
+            pushes |= _PAWN_DOUBLE[white, sq] & ~occupancy
+        return pushes | _PAWN_ATTACKS[white, sq] & enemy
+
+    @njit(
+        "boolean(int64, int64, uint64, uint64, uint64, uint64, uint64, uint64, uint64)",
+        cache=True,
+    )
+    def square_attacked(
+        sq, white, occupancy, captured, pawns, knights, bishops, rooks, kings
+    ):
+        alive = ~captured
+        if (
+            _KNIGHT_ATTACKS[sq] & knights & alive
+            or _KING_ATTACKS[sq] & kings & alive
+            or _PAWN_ATTACKS[white, sq] & pawns & alive
+        ):
+            return True
+        rooks &= alive
+        if rooks & _ROOK_RAYS[sq] and rook_moves(sq, occupancy, _NONE) & rooks:
+            return True
+        bishops &= alive
+        return (
+            bishops & _BISHOP_RAYS[sq] != 0
+            and bishop_moves(sq, occupancy, _NONE) & bishops != 0
+        )
+
+    # The pin rays are a full array here, indexed by square, as numba cannot
+    # return a dict of Python ints
+    @njit(
+        "Tuple((uint64, uint64, uint64[:]))(int64, int64, uint64, uint64, uint64, uint64, uint64, uint64, uint64)",
+        cache=True,
+    )
+    def _pin_masks(
+        king_sq, white, occupancy, own, pawns, knights, bishops, rooks, kings
+    ):
+        checkers = (
+            _KNIGHT_ATTACKS[king_sq] & knights
+            | _KING_ATTACKS[king_sq] & kings
+            | _PAWN_ATTACKS[white, king_sq] & pawns
+        )
+        pinned = _NONE
+        pin_rays = np.zeros(64, dtype=np.uint64)
+        snipers = rooks & _ROOK_RAYS[king_sq] | bishops & _BISHOP_RAYS[king_sq]
+        for target in range(64):
+            bit = _ONE << np.uint64(target)
+            if not snipers & bit:
+                continue
+            ray = _BETWEEN[king_sq, target]
+            blockers = ray & occupancy
+            if not blockers:
+                checkers |= bit
+            elif not blockers & (blockers - _ONE) and blockers & own:
+                pinned |= blockers
+                for blocker in range(64):
+                    if blockers == _ONE << np.uint64(blocker):
+                        pin_rays[blocker] = ray | bit
+
+        if not checkers:
+            return ~_NONE, pinned, pin_rays
+        if checkers & (checkers - _ONE):
+            return _NONE, pinned, pin_rays
+        for checker in range(64):
+            if checkers == _ONE << np.uint64(checker):
+                return checkers | _BETWEEN[king_sq, checker], pinned, pin_rays
+        return checkers, pinned, pin_rays
+
+    @njit(
+        "uint64(uint64, int64, int64, uint64, uint64, uint64, uint64, uint64, uint64)",
+        cache=True,
+    )
+    def king_legal_moves(
+        targets, sq, white, occupancy, pawns, knights, bishops, rooks, kings
+    ):
+        occupancy &= ~(_ONE << np.uint64(sq))
+        legal = targets
+        for target in range(64):
+            bit = _ONE << np.uint64(target)
+            if not targets & bit:
+                continue
+            if square_attacked(
+                target,
+                white,
+                occupancy | bit,
+                bit,
+                pawns,
+                knights,
+                bishops,
+                rooks,
+                kings,
+            ):
+                legal ^= bit
+        return legal
+
+    @njit("int64(uint64)", cache=True)
+    def _popcount(x):
+        # numba has no int.bit_count, count the bits in parallel within the word
+        x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+        x = (x & np.uint64(0x3333333333333333)) + (
+            (x >> np.uint64(2)) & np.uint64(0x3333333333333333)
+        )
+        x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+        return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+    @njit("float64(uint64, uint64)", cache=True)
+    def heuristic_value(valid, enemy):
+        mobility = 0.05 * _popcount(valid)
+        attack = _ATTACK_BONUS[_popcount(valid & enemy)]
+        center = _CENTER_BONUS[_popcount(valid & _CENTER)]
+        return mobility + attack + center
+
+    @njit("float64(uint64[:], int64, int64, uint64, uint64, uint64)", cache=True)
+    def _side_heuristics(bb, white, king_sq, occupancy, own, enemy):
+        them = 1 - white
+        queens = bb[QUEEN * 2 + them]
+        pawns = bb[PAWN * 2 + them]
+        knights = bb[KNIGHT * 2 + them]
+        bishops = bb[BISHOP * 2 + them] | queens
+        rooks = bb[ROOK * 2 + them] | queens
+        kings = bb[KING * 2 + them]
+        if king_sq < 0:
+            check_mask = ~_NONE
+            pinned = _NONE
+            pin_rays = np.zeros(64, dtype=np.uint64)
+        else:
+            check_mask, pinned, pin_rays = _pin_masks(
+                king_sq, white, occupancy, own, pawns, knights, bishops, rooks, kings
+            )
+
+        total = 0.0
+        for kind in KINDS:
+            pieces = bb[kind * 2 + white]
+            for sq in range(64):
+                bit = _ONE << np.uint64(sq)
+                if not pieces & bit:
+                    continue
+                if kind == PAWN:
+                    targets = pawn_moves(sq, white, occupancy, enemy)
+                elif kind == ROOK:
+                    targets = rook_moves(sq, occupancy, own)
+                elif kind == KNIGHT:
+                    targets = knight_moves(sq, own)
+                elif kind == BISHOP:
+                    targets = bishop_moves(sq, occupancy, own)
+                elif kind == QUEEN:
+                    targets = queen_moves(sq, occupancy, own)
+                else:
+                    targets = king_moves(sq, own)
+
+                if sq == king_sq:
+                    targets = king_legal_moves(
+                        targets,
+                        sq,
+                        white,
+                        occupancy,
+                        pawns,
+                        knights,
+                        bishops,
+                        rooks,
+                        kings,
+                    )
+                else:
+                    targets &= check_mask
+                    if pinned & bit:
+                        targets &= pin_rays[sq]
+                total += heuristic_value(targets, enemy)
+        return total
+
+    @njit("float64(uint64[:], uint64, uint64, int64, int64)", cache=True)
+    def _heuristic_balance(bb, occ_white, occ_black, white_king_sq, black_king_sq):
+        occupancy = occ_white | occ_black
+        return _side_heuristics(
+            bb, 1, white_king_sq, occupancy, occ_white, occ_black
+        ) - _side_heuristics(bb, 0, black_king_sq, occupancy, occ_black, occ_white)
+
+    def pin_masks(
+        king_sq, white, occupancy, own, pawns, knights, bishops, rooks, kings
+    ):
+        # The callers mask Python int bitboards with the results, numpy scalars
+        # would leak into them
+        check_mask, pinned, pin_rays = _pin_masks(
+            king_sq, white, occupancy, own, pawns, knights, bishops, rooks, kings
+        )
+        return int(check_mask), int(pinned), pin_rays.tolist()
+
+    def heuristic_balance(bb, occ_white, occ_black, white_king_sq, black_king_sq):
+        # The board keeps its bitboards as a list of Python ints
+        return _heuristic_balance(
+            np.array(bb, dtype=np.uint64),
+            occ_white,
+            occ_black,
+            white_king_sq,
+            black_king_sq,
+        )
@@ -0,0 +1,237 @@
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (1, -1), (-1, 1), (1, 1))
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+# Magic multipliers for "fancy" magic bitboards. They were found offline by a
+# random search over sparse 64-bit numbers and map every relevant occupancy of
+# a square onto a collision-free index of its attack table.
+ROOK_MAGIC = (
+    0x0280005280204004,
+    0x0440100040082002,
+    0x0080100020008009,
+    0x0600060090082040,
+    0x1200090200209004,
+    0x5C80018004000200,
+    0x0200008312004C08,
+    0x8200104481040222,
+    0x8000802080004000,
+    0x4000804000802000,
+    0x0008802000100084,
+    0x000A004010082202,
+    0x0000808008000400,
+    0x1280800200040080,
+    0x0642002200012894,
+    0x0001000080410022,
+    0x1680848008204006,
+    0x0050124020004001,
+    0x0000828010012003,
+    0x1008008080100008,
+    0x2044008008008004,
+    0xC001080120044010,
+    0x001044000801B002,
+    0x001802001E48810C,
+    0x0081400880008564,
+    0x4910004140002001,
+    0x7040200100410010,
+    0x0008100080080082,
+    0x0100100500080100,
+    0x0C04020080040080,
+    0x4000102400680201,
+    0x0020004200008401,
+    0x0080002000404000,
+    0x0010004000402010,
+    0x0000401101002002,
+    0x2001880184801000,
+    0x08A0800800800400,
+    0x020A008002801400,
+    0x0100021004000108,
+    0x000000890200004C,
+    0x0040224000858000,
+    0x0824200450004001,
+    0x0880200041010018,
+    0x0001041000090020,
+    0x0444008040080800,
+    0x0001000400490002,
+    0x0032010002008080,
+    0x02004440810A0004,
+    0x4082008100204200,
+    0x0800201000400040,
+    0x0A04802210420200,
+    0x0040810800500180,
+    0x0060440008008280,
+    0x0042000810040200,
+    0xC400100182080400,
+    0x0244008420510200,
+    0x0000208000110C41,
+    0x0001001020804001,
+    0x0A031D004010A001,
+    0x4208900061084501,
+    0x0442000804112002,
+    0x08420004013008A2,
+    0x400202A11002180C,
+    0x0000088044110022,
+)
+
+BISHOP_MAGIC = (
+    0x0240021084090042,
+    0x0C08418404004600,
+    0x0004014202040120,
+    0x10680A0022008404,
+    0x8004042000000121,
+    0x0081042006000000,
+    0x0000881128A00500,
+    0x0422005208012804,
+    0x00420404102C0130,
+    0x320010D020808880,
+    0x0482082840408080,
+    0x04082C4101204010,
+    0x0820040420010000,
+    0x8100008804410200,
+    0x01A1010088200821,
+    0x2000009088882000,
+    0x0040A010040810B0,
+    0x4824C020010C0111,
+    0x8108082408102008,
+    0x0000842802004498,
+    0x2902201400A00081,
+    0x0505028080414000,
+    0x0142200400840400,
+    0x000021010C010410,
+    0x0020620110D42101,
+    0x4064044082080822,
+    0x1001064210008600,
+    0x0021080014004010,
+    0x0013011019004001,
+    0x8208020002412890,
+    0x300A2C1822108200,
+    0x0441010020208810,
+    0x0441300800D02104,
+    0x0041082010020400,
+    0x0808904400281800,
+    0x3800D10802040040,
+    0x1004104010840100,
+    0x0010108200202209,
+    0x00640802843220A4,
+    0x0004040028009480,
+    0x80C2100208102000,
+    0x1418820120001010,
+    0x0202001048004401,
+    0x0210020102422400,
+    0x4000200820815010,
+    0xA0400880A3004080,
+    0x80044C2C00500408,
+    0x0084A40400480020,
+    0x8042080202900010,
+    0x0006010402024400,
+    0x100E1A0200922800,
+    0x2002800884040005,
+    0x00020420E0410108,
+    0x2808A02510008300,
+    0x0020543006104810,
+    0x085010018534C000,
+    0x2241008800880420,
+    0x2000450068020800,
+    0x0800004080480820,
+    0x2000B84000420203,
+    0x8100087010020220,
+    0x0108003021034904,
+    0x2008500308610400,
+    0x102202082A0400C0,
+)
+
+
+def _sliding_attacks(sq, occupancy, directions):
+    """
+    Walks the given directions from a square until a blocker or the board edge is hit.
+    Blocking cells are part of the attack set, regardless of the color of the blocking piece.
+    """
+    row, col = divmod(sq, 8)
+    attacks = 0
+    for direction_row, direction_col in directions:
+        current_row = row + direction_row
+        current_col = col + direction_col
+        while 0 <= current_row < 8 and 0 <= current_col < 8:
+            bit = 1 << (current_row * 8 + current_col)
+            attacks |= bit
+            if occupancy & bit:
+                break
+            current_row += direction_row
+            current_col += direction_col
+    return attacks
+
+
+def _relevant_mask(sq, directions):
+    """
+    Returns the cells whose occupancy can change the attack set of a slider on the given square.
+    The last cell of each ray is left out, as a piece there never blocks anything behind it.
+    """
+    row, col = divmod(sq, 8)
+    mask = 0
+    for direction_row, direction_col in directions:
+        current_row = row + direction_row
+        current_col = col + direction_col
+        while (
+            0 <= current_row + direction_row < 8
+            and 0 <= current_col + direction_col < 8
+        ):
+            mask |= 1 << (current_row * 8 + current_col)
+            current_row += direction_row
+            current_col += direction_col
+    return mask
+
+
+def _build_tables(magics, directions):
+    """
+    Builds relevant masks, shifts and attack tables for one slider type.
+    Every subset of a square's relevant mask is enumerated (carry-rippler trick) and its attack set stored at the magic index.
+    """
+    masks = []
+    shifts = []
+    tables = []
+    for sq in range(64):
+        mask = _relevant_mask(sq, directions)
+        shift = 64 - mask.bit_count()
+        table = [0] * (1 << mask.bit_count())
+
+        subset = 0
+        while True:
+            index = ((subset * magics[sq]) & MASK64) >> shift
+            table[index] = _sliding_attacks(sq, subset, directions)
+            subset = (subset - mask) & mask
+            if not subset:
+                break
+
+        masks.append(mask)
+        shifts.append(shift)
+        tables.append(table)
+    return masks, shifts, tables
+
+
+ROOK_MASK, ROOK_SHIFT, ROOK_TABLE = _build_tables(ROOK_MAGIC, ROOK_DIRECTIONS)
+BISHOP_MASK, BISHOP_SHIFT, BISHOP_TABLE = _build_tables(BISHOP_MAGIC, BISHOP_DIRECTIONS)
+
+
+def build_lookup(masks, magics, shifts, tables):
+    """
+    Maps, per square, every relevant occupancy straight to its attack set.
+    In plain Python, one dict lookup with the int key is faster than computing the magic index.
+    """
+    lookups = []
+    for sq in range(64):
+        mask = masks[sq]
+        lookup = {}
+        subset = 0
+        while True:
+            lookup[subset] = tables[sq][((subset * magics[sq]) & MASK64) >> shifts[sq]]
+            subset = (subset - mask) & mask
+            if not subset:
+                break
+        lookups.append(lookup)
+    return lookups
+
+
+# Attacks on an empty board. A slider outside these rays can never attack the
+# square, whatever stands in between, so they serve as a cheap pre-test.
+ROOK_RAYS = [_sliding_attacks(sq, 0, ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_RAYS = [_sliding_attacks(sq, 0, BISHOP_DIRECTIONS) for sq in range(64)]
@@ -1,8 +1,24 @@
 from __future__ import annotations
 
+import random
 from typing import TYPE_CHECKING, NamedTuple
 
-import numpy as np
+from kernels import (
+    BISHOP,
+    KING,
+    KNIGHT,
+    PAWN,
+    QUEEN,
+    ROOK,
+    bishop_moves,
+    heuristic_value,
+    king_legal_moves,
+    king_moves,
+    knight_moves,
+    pawn_moves,
+    queen_moves,
+    rook_moves,
+)
 
 if TYPE_CHECKING:
     from board import Board
@@ -13,6 +29,21 @@ class Cell(NamedTuple):
     column: int
 
 
+# The (row, col) cell of every square. Cells are handed out from here instead of
+# creating a new tuple every time one is needed.
+CELLS = tuple((sq >> 3, sq & 7) for sq in range(64))
+
+
+def _bb_to_cells(bb):
+    """
+    Yields the (row, col) cells of the set bits of a bitboard.
+    """
+    while bb:
+        lsb = bb & -bb
+        yield CELLS[lsb.bit_length() - 1]
+        bb ^= lsb
+
+
 class Piece:
     """
     Base class for pieces on the board.
@@ -21,6 +52,13 @@ class Piece:
     In this class, you need to implement two methods, the "evaluate()" method and the "get_valid_cells()" method.
     """
 
+    # Fixed attribute set, avoids a per-instance __dict__ and speeds up attribute access
+    __slots__ = ("board", "cell", "sq", "white")
+
+    # Integer piece type, set by each subclass. Used to index per-type tables
+    # (bitboards, Zobrist keys) as ``KIND * 2 + white``.
+    KIND = None
+
     def __init__(self, board: Board, white):
         """
         Constructor for a piece based on provided parameters
@@ -31,6 +69,7 @@ class Piece:
         self.board: Board = board
         self.white = white
         self.cell = None
+        self.sq = None
 
     def is_white(self):
         """
@@ -73,48 +112,24 @@ class Piece:
         :return: Return numerical score between -infinity and +infinity. Greater values indicate better evaluation result (more favorable).
         """
         # Material value (test-safe)
-        if isinstance(self, Pawn):
-            base = 1.0
-        elif isinstance(self, Knight):
-            base = 3.0
-        elif isinstance(self, Bishop):
-            base = 3.0
-        elif isinstance(self, Rook):
-            base = 5.0
-        elif isinstance(self, Queen):
-            base = 9.0
-        elif isinstance(self, King):
-            base = 1000.0
-        else:
-            base = 0.0
+        base = PIECE_VALUES[self.KIND]
 
         # Keep tests stable: default is material-only
         if not use_heuristics:
             return base
 
-        # Simple extra factors for AI (small weights)
-        mobility = 0.0
-        attack = 0.0
-        center = 0.0
-
-        valid_cells = self.get_valid_cells()
-        mobility = 0.05 * len(valid_cells)  # more legal moves = slightly better
+        return base + self.evaluate_heuristics()
 
-        # Count capturable enemy pieces
-        for cell in valid_cells:
-            target = self.board.get_cell(cell)
-            if target is None:
-                continue
-            if target.white != self.white:
-                attack += 0.10  # small bonus per possible capture
-
-        # Prefer center control a bit
-        for cell in valid_cells:
-            r, c = int(cell[0]), int(cell[1])
-            if 2 <= r <= 5 and 2 <= c <= 5:
-                center += 0.01
-
-        return base + mobility + attack + center
+    def evaluate_heuristics(self):
+        """
+        Returns the heuristic part of :py:meth:`evaluate`, i.e. the score of this piece on top of its material value.
+        The board counts material straight from its bitboards and scores the valid cells of all pieces with
+        :py:func:`heuristic_balance <kernels.heuristic_balance>`.
+        """
+        board = self.board
+        return heuristic_value(
+            self.get_valid_bb(), board.occ_black if self.white else board.occ_white
+        )
 
     def get_valid_cells(self):
         """
@@ -125,50 +140,66 @@ class Piece:
         (see `get_reachable_cells`), and
         - After moving to this cell, the own King is not (or no longer) in check.
 
-        Use `get_reachable_cells` to get all reachable cells. For each reachable
-        cell, temporarily move the piece to that cell and check whether the own
-        King (same color) is in check using `is_king_check_cached`. If the King is
-        not in check after the move, add the cell to the list of valid cells.
-        After each test, restore the original board state.
-
-        To simulate a move, first store the current position of the piece
-        (`self.cell`). The target cell may already contain another piece. Retrieve
-        and store that piece using `get_cell`. Then place this piece on the target
-        cell using `set_cell` and perform the check. Finally, restore the original
-        board configuration by moving this piece back to its old cell and placing
-        the previously stored piece back on the target cell.
+        The cells are taken from :py:meth:`get_valid_bb`.
 
         Returns:
             list: A list of valid cells this piece can legally move to.
         """
-        valid_cells = []
-
-        reachable_cells = self.get_reachable_cells()
-        if self.cell is None:
-            return valid_cells
-
-        old_cell = np.array(self.cell)
-
-        for target_cell in reachable_cells:
-            captured_piece = self.board.get_cell(target_cell)
+        return list(_bb_to_cells(self.get_valid_bb()))
 
-            # Temporarily move this piece to the target cell
-            self.board.set_cell(target_cell, self)
-
-            # Check if own King is in check after the move
-            king_in_check = self.board.is_king_check_cached(self.white)
-
-            # Restore original board configuration (order matters!)
-            self.board.set_cell(old_cell, self)
-            self.board.set_cell(target_cell, captured_piece)
-
-            if not king_in_check:
-                valid_cells.append(target_cell)
+    def get_valid_bb(self):
+        """
+        Returns the cells of :py:meth:`get_valid_cells` as bitboard, bit ``row * 8 + col`` set per cell.
 
-        return valid_cells
+        No move is made on the board for that. Pieces other than the King are filtered
+        with the check mask and pin rays of their color, see
+        :py:meth:`pin_masks_cached <board.Board.pin_masks_cached>`. For the King itself,
+        `square_attacked` tests each target with the occupancy after the move and
+        ignores a captured piece.
+        """
+        if self.cell is None:
+            return 0
+
+        board = self.board
+        white = self.white
+        king = board.kings[white]
+
+        # All cells the piece can reach, the checks below keep the legal ones
+        reachable = self.get_reachable_bb()
+
+        # Without a king, there is no check to avoid
+        if king is None:
+            return reachable
+
+        # Any other piece must resolve a check and stay on its pin ray, if pinned
+        if king is not self:
+            check_mask, pinned, pin_rays = board.pin_masks_cached(white)
+            reachable &= check_mask
+            if pinned >> self.sq & 1:
+                reachable &= pin_rays[self.sq]
+            return reachable
+
+        # The King must not step onto an attacked cell
+        bb = board.bb
+        them = not white
+        queens = bb[Queen.KIND * 2 + them]
+        return king_legal_moves(
+            reachable,
+            self.sq,
+            white,
+            board.occupancy,
+            bb[Pawn.KIND * 2 + them],
+            bb[Knight.KIND * 2 + them],
+            bb[Bishop.KIND * 2 + them] | queens,
+            bb[Rook.KIND * 2 + them] | queens,
+            bb[King.KIND * 2 + them],
+        )
 
 
 class Pawn(Piece):  # Bauer
+    __slots__ = ()
+    KIND = PAWN
+
     def __init__(self, board, white):
         super().__init__(board, white)
 
@@ -190,47 +221,26 @@ class Pawn(Piece):  # Bauer
 
         **NOTE**: For all you deep chess experts: Hitting `en passant <https://de.wikipedia.org/wiki/En_passant>`_ does not need to be implemented.
 
-        :return: A list of reachable cells this pawn could move into.
-        """
-        moves: list[Cell] = []
-        row, column = self.cell
-        if self.is_white():
-            move_forward: Cell = (row + 1, column)
-            if self.board.cell_is_valid_and_empty(move_forward):
-                moves.append(move_forward)
-            if row == 1:
-                kick_start: Cell = (row + 2, column)
-                if self.board.cell_is_valid_and_empty(
-                    kick_start
-                ) and self.board.cell_is_valid_and_empty(move_forward):
-                    moves.append(kick_start)
-            white_hit_right: Cell = (row + 1, column + 1)
-            if self.can_hit_on_cell(white_hit_right):
-                moves.append(white_hit_right)
-            white_hit_left: Cell = (row + 1, column - 1)
-            if self.can_hit_on_cell(white_hit_left):
-                moves.append(white_hit_left)
-        else:
-            move_forward: Cell = (row - 1, column)
-            if self.board.cell_is_valid_and_empty(move_forward):
-                moves.append(move_forward)
-            if row == 6:
-                kick_start: Cell = (row - 2, column)
-                if self.board.cell_is_valid_and_empty(
-                    kick_start
-                ) and self.board.cell_is_valid_and_empty(move_forward):
-                    moves.append(kick_start)
-            black_hit_right: Cell = (row - 1, column - 1)
-            if self.can_hit_on_cell(black_hit_right):
-                moves.append(black_hit_right)
-            black_hit_left: Cell = (row - 1, column + 1)
-            if self.can_hit_on_cell(black_hit_left):
-                moves.append(black_hit_left)
-
-        return moves
+        :return: The reachable cells this pawn could move into, yielded one by one.
+        """
+        return _bb_to_cells(self.get_reachable_bb())
+
+    def get_reachable_bb(self):
+        """
+        Returns the cells of :py:meth:`get_reachable_cells` as bitboard, bit ``row * 8 + col`` set per cell.
+        """
+        # Push, dash and hit masks are precomputed per square and color, the
+        # occupancy bitboards sort out blocked pushes and cells without an enemy
+        board = self.board
+        return pawn_moves(
+            self.sq, self.white, board.occupancy, board.own_occ(not self.white)
+        )
 
 
 class Rook(Piece):  # Turm
+    __slots__ = ()
+    KIND = ROOK
+
     def __init__(self, board, white):
         super().__init__(board, white)
 
@@ -248,42 +258,23 @@ class Rook(Piece):  # Turm
         :py:meth:`can_hit_on_cell <pieces.Piece.can_hit_on_cell>` and :py:meth:`can_enter_cell <pieces.Piece.can_enter_cell>`
         to check for necessary conditions to implement the rook movability mechanics.
 
-        :return: A list of reachable cells this rook could move into.
+        :return: The reachable cells this rook could move into, yielded one by one.
         """
-        reachable_cells = []
-
-        row, col = self.cell
-
-        directions = {
-            (-1, 0),
-            (1, 0),
-            (0, -1),
-            (0, 1),
-        }
-
-        for direction_row, direction_col in directions:
-            current_row = row + direction_row
-            current_col = col + direction_col
-
-            while True:
-                current_cell = (current_row, current_col)
-
-                if self.board.cell_is_valid_and_empty(current_cell):
-                    reachable_cells.append(current_cell)
-
-                    current_row += direction_row
-                    current_col += direction_col
+        return _bb_to_cells(self.get_reachable_bb())
 
-                elif self.can_hit_on_cell(current_cell):
-                    reachable_cells.append(current_cell)
-                    break
-                else:
-                    break
-
-        return reachable_cells
+    def get_reachable_bb(self):
+        """
+        Returns the cells of :py:meth:`get_reachable_cells` as bitboard, bit ``row * 8 + col`` set per cell.
+        """
+        # Magic lookup yields all cells up to and including the first blocker of every ray
+        board = self.board
+        return rook_moves(self.sq, board.occupancy, board.own_occ(self.white))
 
 
 class Knight(Piece):  # Springer
+    __slots__ = ()
+    KIND = KNIGHT
+
     def __init__(self, board, white):
         super().__init__(board, white)
 
@@ -299,35 +290,22 @@ class Knight(Piece):  # Springer
         :py:meth:`can_hit_on_cell <pieces.Piece.can_hit_on_cell>` and :py:meth:`can_enter_cell <pieces.Piece.can_enter_cell>`
         to check for necessary conditions to implement the rook movability mechanics.
 
-        :return: A list of reachable cells this knight could move into.
+        :return: The reachable cells this knight could move into, yielded one by one.
         """
-        reachable_cells = []
-        row, col = self.cell
-
-        directions = {
-            (-2, -1),
-            (-2, 1),
-            (2, -1),
-            (2, 1),
-            (-1, -2),
-            (-1, 2),
-            (1, -2),
-            (1, 2),
-        }
+        return _bb_to_cells(self.get_reachable_bb())
 
-        for direction_row, direction_col in directions:
-            target_cell = (row + direction_row, col + direction_col)
-
-            if self.board.cell_is_valid_and_empty(target_cell):
-                reachable_cells.append(target_cell)
-
-            elif self.board.piece_can_hit_on_cell(self, target_cell):
-                reachable_cells.append(target_cell)
-
-        return reachable_cells
+    def get_reachable_bb(self):
+        """
+        Returns the cells of :py:meth:`get_reachable_cells` as bitboard, bit ``row * 8 + col`` set per cell.
+        """
+        # Table lookup encodes the board edges, masking out own pieces leaves empty and hittable cells
+        return knight_moves(self.sq, self.board.own_occ(self.white))
 
 
 class Bishop(Piece):  # Läufer
+    __slots__ = ()
+    KIND = BISHOP
+
     def __init__(self, board, white):
         super().__init__(board, white)
 
@@ -344,37 +322,22 @@ class Bishop(Piece):  # Läufer
         :py:meth:`can_hit_on_cell <pieces.Piece.can_hit_on_cell>` and :py:meth:`can_enter_cell <pieces.Piece.can_enter_cell>`
         to check for necessary conditions to implement the rook movability mechanics.
 
-        :return: A list of reachable cells this bishop could move into.
+        :return: The reachable cells this bishop could move into, yielded one by one.
         """
-        reachable_cells = []
-
-        row, col = self.cell
-
-        directions = {(-1, -1), (1, -1), (-1, 1), (1, 1)}
-
-        for direction_row, direction_col in directions:
-            current_row = row + direction_row
-            current_col = col + direction_col
-
-            while True:
-                current_cell = (current_row, current_col)
-
-                if self.board.cell_is_valid_and_empty(current_cell):
-                    reachable_cells.append(current_cell)
-
-                    current_row += direction_row
-                    current_col += direction_col
-
-                elif self.can_hit_on_cell(current_cell):
-                    reachable_cells.append(current_cell)
-                    break
-                else:
-                    break
+        return _bb_to_cells(self.get_reachable_bb())
 
-        return reachable_cells
+    def get_reachable_bb(self):
+        """
+        Returns the cells of :py:meth:`get_reachable_cells` as bitboard, bit ``row * 8 + col`` set per cell.
+        """
+        board = self.board
+        return bishop_moves(self.sq, board.occupancy, board.own_occ(self.white))
 
 
 class Queen(Piece):  # Königin
+    __slots__ = ()
+    KIND = QUEEN
+
     def __init__(self, board, white):
         super().__init__(board, white)
 
@@ -392,46 +355,23 @@ class Queen(Piece):  # Königin
         :py:meth:`can_hit_on_cell <pieces.Piece.can_hit_on_cell>` and :py:meth:`can_enter_cell <pieces.Piece.can_enter_cell>`
         to check for necessary conditions to implement the rook movability mechanics.
 
-        :return: A list of reachable cells this queen could move into.
+        :return: The reachable cells this queen could move into, yielded one by one.
         """
-        reachable_cells = []
-
-        row, col = self.cell
-
-        directions = {
-            (-1, 0),
-            (1, 0),
-            (0, -1),
-            (0, 1),
-            (-1, -1),
-            (1, -1),
-            (-1, 1),
-            (1, 1),
-        }
-
-        for direction_row, direction_col in directions:
-            current_row = row + direction_row
-            current_col = col + direction_col
-
-            while True:
-                current_cell = (current_row, current_col)
-
-                if self.board.cell_is_valid_and_empty(current_cell):
-                    reachable_cells.append(current_cell)
-
-                    current_row += direction_row
-                    current_col += direction_col
+        return _bb_to_cells(self.get_reachable_bb())
 
-                elif self.can_hit_on_cell(current_cell):
-                    reachable_cells.append(current_cell)
-                    break
-                else:
-                    break
-
-        return reachable_cells
+    def get_reachable_bb(self):
+        """
+        Returns the cells of :py:meth:`get_reachable_cells` as bitboard, bit ``row * 8 + col`` set per cell.
+        """
+        # A queen combines the rays of rook and bishop
+        board = self.board
+        return queen_moves(self.sq, board.occupancy, board.own_occ(self.white))
 
 
 class King(Piece):  # König
+    __slots__ = ()
+    KIND = KING
+
     def __init__(self, board, white):
         super().__init__(board, white)
 
@@ -448,28 +388,36 @@ class King(Piece):  # König
         :py:meth:`can_hit_on_cell <pieces.Piece.can_hit_on_cell>` and :py:meth:`can_enter_cell <pieces.Piece.can_enter_cell>`
         to check for necessary conditions to implement the rook movability mechanics.
 
-        :return: A list of reachable cells this king could move into.
+        :return: The reachable cells this king could move into, yielded one by one.
         """
-        reachable_cells = []
+        return _bb_to_cells(self.get_reachable_bb())
+
+    def get_reachable_bb(self):
+        """
+        Returns the cells of :py:meth:`get_reachable_cells` as bitboard, bit ``row * 8 + col`` set per cell.
+        """
+        # The king can enter an empty cell or a cell with an enemy piece
+        return king_moves(self.sq, self.board.own_occ(self.white))
+
+
+PIECE_TYPES = (Pawn, Rook, Knight, Bishop, Queen, King)
 
-        row, col = self.cell
+# Material value of every piece kind, indexed by KIND
+PIECE_VALUES = (1, 5, 3, 3, 9, 1000)
 
-        directions = [
-            (-1, -1),
-            (-1, 0),
-            (-1, 1),
-            (0, -1),
-            (0, 1),
-            (1, -1),
-            (1, 0),
-            (1, 1),
-        ]
+# Name of every piece kind, indexed by KIND
+PIECE_NAMES = ("Pawn", "Rook", "Knight", "Bishop", "Queen", "King")
 
-        for dr, dc in directions:
-            target_cell = (row + dr, col + dc)
+# Board character of every (piece kind, color) as ASCII byte, indexed like ZOBRIST.
+# White pieces use upper case letters.
+PIECE_CHARACTERS = b"pPrRnNbBqQkK"
 
-            # The king can enter an empty cell or a cell with an enemy piece
-            if self.can_enter_cell(target_cell):
-                reachable_cells.append(target_cell)
+# Zobrist keys: one random 64-bit number per (piece kind, color) and square,
+# indexed as ZOBRIST[piece.KIND * 2 + piece.white][sq].
+# A position hashes to the XOR of the keys of all placed pieces. The fixed seed
+# keeps hashes reproducible between runs.
+_zobrist_rng = random.Random(0xC0FFEE)
+ZOBRIST = [[_zobrist_rng.getrandbits(64) for _ in range(64)] for _ in range(12)]
 
-        return reachable_cells
+# Extra key of positions with black to move, the board itself does not know whose turn it is
+ZOBRIST_BLACK_TO_MOVE = _zobrist_rng.getrandbits(64)
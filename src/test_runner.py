@@ -1,4 +1,6 @@
 import json
+import random
+import sys
 import unittest
 
 from unittest_prettify.colorize import (
@@ -6,8 +8,16 @@ from unittest_prettify.colorize import (
     colorize,
 )
 
+import engine
 from board import Board, InvalidColumnException, InvalidRowException
-from engine import MinMaxArg, evaluate_all_possible_moves
+from engine import (
+    MinMaxArg,
+    clear_eval_cache,
+    evaluate_all_possible_moves,
+    minMax_cached,
+    suggest_move,
+)
+from kernels import bishop_moves, pawn_moves, queen_moves, rook_moves
 from pieces import Bishop, King, Knight, Pawn, Queen, Rook
 from util import (
     cell_to_string,
@@ -15,23 +25,43 @@ from util import (
     map_piece_to_fullname,
 )
 
+# Colored docstrings only help on a terminal, redirected output gets the plain text
+if not sys.stdout.isatty():
 
-def iterate_pieces(board):
-    for row in board.cells:
-        for piece in row:
-            if piece is None:
-                continue
+    def colorize(color=RED):
+        return lambda something: something
 
-            yield piece
+
+def iterate_pieces(board):
+    # The board keeps its pieces per color, one list of both is all the tests need
+    white = board.iterate_cells_with_pieces(True)
+    return white + board.iterate_cells_with_pieces(False)
+
+
+def walk_rays(sq, occupancy, directions):
+    # Step along every direction until the board edge or the first occupied
+    # cell, which is part of the attacks whatever piece stands there
+    row, col = divmod(sq, 8)
+    attacks = 0
+    for rowStep, colStep in directions:
+        targetRow = row + rowStep
+        targetCol = col + colStep
+        while 0 <= targetRow < 8 and 0 <= targetCol < 8:
+            bit = 1 << (targetRow * 8 + targetCol)
+            attacks |= bit
+            if occupancy & bit:
+                break
+            targetRow += rowStep
+            targetCol += colStep
+    return attacks
 
 
 def print_movability_error(board, piece, cell, positiveMovement):
-    RED = "\x1b[31m"
     GREEN = "\x1b[32m"
     RESET = "\x1b[37m"
-    text = RED + "Movability wrongly implemented. In this configuration\n\n"
+    parts = [RED + "Movability wrongly implemented. In this configuration\n\n"]
     for row in range(7, -1, -1):
-        text += "        " + RESET + f"{row + 1} "
+        parts.append("        " + RESET + f"{row + 1} ")
         for col in range(8):
             color = RESET
             if piece.cell[0] == row and piece.cell[1] == col:
@@ -39,21 +69,23 @@ def print_movability_error(board, piece, cell, positiveMovement):
             if cell[0] == row and cell[1] == col:
                 color = GREEN
 
-            text += color + map_piece_to_character(board.get_cell((row, col))) + " "
-        text += "\n"
+            parts.append(
+                color + map_piece_to_character(board.get_cell((row, col))) + " "
+            )
+        parts.append("\n")
 
     files = ["a", "b", "c", "d", "e", "f", "g", "h"]
-    text += "          "
+    parts.append("          ")
     for col in range(8):
-        text += f"{files[col]} "
+        parts.append(f"{files[col]} ")
 
-    text += "\n\n"
+    parts.append("\n\n")
     center = (
         " should be able to move to "
         if positiveMovement
         else " should not be able to move to "
     )
-    text += (
+    parts.append(
         RED
         + map_piece_to_fullname(piece)
         + " on "
@@ -63,16 +95,41 @@ def print_movability_error(board, piece, cell, positiveMovement):
         + cell_to_string(cell)
         + " (green)."
     )
-    text += "\n" + RESET
+    parts.append("\n" + RESET)
 
-    print(text)
+    print("".join(parts))
 
 
 class TestBoard(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Cells around the board that must never count as valid
+        cls._invalid_cells = tuple(
+            (row, col)
+            for row in range(-4, 12)
+            for col in range(-4, 12)
+            if not (0 <= row < 8 and 0 <= col < 8)
+        )
+
     def setUp(self):
         self.board = Board()
         self.board.reset()
 
+    def iterate_random_positions(self, seed):
+        """Places 200 random positions with both kings and up to 18 other pieces on the board, one per iteration"""
+        rng = random.Random(seed)
+        kinds = (Pawn, Rook, Knight, Bishop, Queen)
+        for _ in range(200):
+            self.board.clear_board()
+            squares = rng.sample(range(64), rng.randint(3, 20))
+            self.board.set_cell(divmod(squares[0], 8), King(self.board, True))
+            self.board.set_cell(divmod(squares[1], 8), King(self.board, False))
+            for sq in squares[2:]:
+                piece = rng.choice(kinds)(self.board, rng.random() < 0.5)
+                self.board.set_cell(divmod(sq, 8), piece)
+
+            yield
+
     # ---------------------------------------------------------------------------
     # Phase A – Board-Basics
     # ---------------------------------------------------------------------------
@@ -145,15 +202,11 @@ class TestBoard(unittest.TestCase):
     @colorize(color=RED)
     def test_A05_valid_cells_outside(self):
         """board.is_valid_cell() should return False for all cells in range not in (0..7, 0..7)"""
-        for row in range(-4, 12):
-            for col in range(-4, 12):
-                if row >= 0 and row < 8 and col >= 0 and col < 8:
-                    continue
-
-                self.assertFalse(
-                    self.board.is_valid_cell((row, col)),
-                    f"({row}, {col}) should not be a valid cell!",
-                )
+        for row, col in self._invalid_cells:
+            self.assertFalse(
+                self.board.is_valid_cell((row, col)),
+                f"({row}, {col}) should not be a valid cell!",
+            )
 
     @colorize(color=RED)
     def test_A06_cell_is_valid_and_empty(self):
@@ -174,15 +227,11 @@ class TestBoard(unittest.TestCase):
                     )
 
         # Test invalid cells as well
-        for row in range(-4, 12):
-            for col in range(-4, 12):
-                if row >= 0 and row < 8 and col >= 0 and col < 8:
-                    continue
-
-                self.assertFalse(
-                    self.board.is_valid_cell((row, col)),
-                    f"({row}, {col}) should not be a valid cell!",
-                )
+        for row, col in self._invalid_cells:
+            self.assertFalse(
+                self.board.cell_is_valid_and_empty((row, col)),
+                f"({row}, {col}) should not be a valid cell!",
+            )
 
     @colorize(color=RED)
     def test_A07_piece_can_enter(self):
@@ -220,15 +269,11 @@ class TestBoard(unittest.TestCase):
                     )
 
         # Test invalid cells as well
-        for row in range(-4, 12):
-            for col in range(-4, 12):
-                if row >= 0 and row < 8 and col >= 0 and col < 8:
-                    continue
-
-                self.assertFalse(
-                    self.board.is_valid_cell((row, col)),
-                    f"({row}, {col}) should not be enterable as it is not a valid cell!",
-                )
+        for row, col in self._invalid_cells:
+            self.assertFalse(
+                self.board.piece_can_enter_cell(piece, (row, col)),
+                f"({row}, {col}) should not be enterable as it is not a valid cell!",
+            )
 
     @colorize(color=RED)
     def test_A08_piece_can_hit_on_cell(self):
@@ -270,15 +315,11 @@ class TestBoard(unittest.TestCase):
                     )
 
         # Test invalid cells as well
-        for row in range(-4, 12):
-            for col in range(-4, 12):
-                if row >= 0 and row < 8 and col >= 0 and col < 8:
-                    continue
-
-                self.assertFalse(
-                    self.board.is_valid_cell((row, col)),
-                    f"Should not be able to hit on ({row}, {col}) as it is not a valid cell!",
-                )
+        for row, col in self._invalid_cells:
+            self.assertFalse(
+                self.board.piece_can_hit_on_cell(piece, (row, col)),
+                f"Should not be able to hit on ({row}, {col}) as it is not a valid cell!",
+            )
 
     # ---------------------------------------------------------------------------
     # Phase B – Figurenlogik, König & Evaluation
@@ -315,29 +356,19 @@ class TestBoard(unittest.TestCase):
                 }
 
                 # If they match, all is fine
-                for cell in groundTruth:
-                    if cell in actual:
-                        continue
-
-                    # If not, output a meaningful message
-                    print("\nTestcase name: ", testcase["name"])
-                    print_movability_error(self.board, piece, cell, True)
-                    self.fail(
-                        f"Movement of the {map_piece_to_fullname(piece)} wrongly implemented!"
-                    )
-
-                # If they match, all is fine
-                for cell in actual:
-                    if cell in groundTruth:
-                        continue
-
-                    # If not, output a meaningful message
-                    print("\nTestcase name: ", testcase["name"])
-                    print_movability_error(self.board, piece, cell, False)
+                if actual == groundTruth:
+                    continue
 
-                    self.fail(
-                        f"Movement of the {map_piece_to_fullname(piece)} wrongly implemented!"
-                    )
+                # If not, output a meaningful message for a cell the piece should
+                # reach but does not, or else for one it reaches but should not
+                missing = groundTruth - actual
+                positiveMovement = bool(missing)
+                cell = next(iter(missing or actual - groundTruth))
+                print("\nTestcase name: ", testcase["name"])
+                print_movability_error(self.board, piece, cell, positiveMovement)
+                self.fail(
+                    f"Movement of the {map_piece_to_fullname(piece)} wrongly implemented!"
+                )
 
     @colorize(color=RED)
     def test_B02_iterate_pieces_empty_board(self):
@@ -476,14 +507,14 @@ class TestBoard(unittest.TestCase):
     @colorize(color=RED)
     def test_B06_evaluate(self):
         self.board.reset()
-        self.assertAlmostEqual(
+        self.assertEqual(
             self.board.evaluate(),
             0,
             msg="Evaluate should return 0 on the default board configuration.",
         )
 
         self.board.clear_board()
-        self.assertAlmostEqual(
+        self.assertEqual(
             self.board.evaluate(), 0, msg="Evaluate should return 0 on an empty board."
         )
 
@@ -541,6 +572,206 @@ class TestBoard(unittest.TestCase):
                 "piece.get_valid_cells must not alter board configuration after its return",
             )
 
+    @colorize(color=RED)
+    def test_B08_hash_follows_board_configuration(self):
+        startHash = self.board.hash()
+
+        piece = self.board.get_cell((1, 4))
+        self.board.set_cell((3, 4), piece)
+        self.assertNotEqual(
+            startHash,
+            self.board.hash(),
+            "board.hash must change when a piece is moved",
+        )
+
+        self.board.set_cell((1, 4), piece)
+        self.assertEqual(
+            startHash,
+            self.board.hash(),
+            "board.hash must be restored when a move is undone",
+        )
+
+        # The same configuration reached from scratch must hash identically
+        other = Board()
+        other.load_from_memory(str(self.board))
+        self.assertEqual(
+            startHash,
+            other.hash(),
+            "board.hash must only depend on the board configuration",
+        )
+
+    @colorize(color=RED)
+    def test_B09_slider_kernels_match_ray_walk(self):
+        rookDirections = ((-1, 0), (1, 0), (0, -1), (0, 1))
+        bishopDirections = ((-1, -1), (1, -1), (-1, 1), (1, 1))
+        rng = random.Random(42)
+        for _ in range(500):
+            sq = rng.randrange(64)
+            occupancy = rng.getrandbits(64) & rng.getrandbits(64)
+            own = occupancy & rng.getrandbits(64) & ~(1 << sq)
+
+            rook = walk_rays(sq, occupancy, rookDirections) & ~own
+            bishop = walk_rays(sq, occupancy, bishopDirections) & ~own
+            self.assertEqual(
+                rook_moves(sq, occupancy, own),
+                rook,
+                "rook_moves must match walking the rays",
+            )
+            self.assertEqual(
+                bishop_moves(sq, occupancy, own),
+                bishop,
+                "bishop_moves must match walking the rays",
+            )
+            self.assertEqual(
+                queen_moves(sq, occupancy, own),
+                rook | bishop,
+                "queen_moves must combine rook and bishop rays",
+            )
+
+    @colorize(color=RED)
+    def test_B10_leaper_tables_match_offsets(self):
+        offsets = {
+            Knight: (
+                (-2, -1),
+                (-2, 1),
+                (2, -1),
+                (2, 1),
+                (-1, -2),
+                (-1, 2),
+                (1, -2),
+                (1, 2),
+            ),
+            King: (
+                (-1, -1),
+                (-1, 0),
+                (-1, 1),
+                (0, -1),
+                (0, 1),
+                (1, -1),
+                (1, 0),
+                (1, 1),
+            ),
+        }
+        for piece_type, steps in offsets.items():
+            for sq in range(64):
+                self.board.clear_board()
+                row, col = divmod(sq, 8)
+                piece = piece_type(self.board, True)
+                self.board.set_cell((row, col), piece)
+
+                # Block one target with an own piece, it must not be reachable
+                expected = set()
+                for step_row, step_col in steps:
+                    target = (row + step_row, col + step_col)
+                    if self.board.is_valid_cell(target):
+                        expected.add(target)
+                blocked = min(expected)
+                self.board.set_cell(blocked, Pawn(self.board, True))
+                expected.discard(blocked)
+
+                self.assertEqual(
+                    set(piece.get_reachable_cells()),
+                    expected,
+                    f"{piece_type.__name__} attack table must match its offsets",
+                )
+
+    @colorize(color=RED)
+    def test_B11_pins_and_checks_restrict_valid_cells(self):
+        self.board.clear_board()
+        self.board.set_cell((0, 4), King(self.board, True))
+        self.board.set_cell((7, 0), King(self.board, False))
+
+        # A pinned rook may only move along the line to the pinning rook
+        rook = Rook(self.board, True)
+        self.board.set_cell((1, 4), rook)
+        self.board.set_cell((6, 4), Rook(self.board, False))
+        self.assertEqual(
+            set(rook.get_valid_cells()),
+            {(row, 4) for row in range(2, 7)},
+            "a pinned piece must stay on its pin line",
+        )
+
+        # In check, the only valid move of the knight is blocking the line
+        self.board.set_cell((1, 4), None)
+        knight = Knight(self.board, True)
+        self.board.set_cell((2, 3), knight)
+        self.assertEqual(
+            knight.get_valid_cells(),
+            [(4, 4)],
+            "in check, a piece may only hit the checker or block its line",
+        )
+
+        # In double check, only the king can move
+        self.board.set_cell((2, 5), Knight(self.board, False))
+        self.assertEqual(
+            knight.get_valid_cells(),
+            [],
+            "in double check, no piece but the king may move",
+        )
+
+    @colorize(color=RED)
+    def test_B12_pawn_tables_match_shifts(self):
+        full = (1 << 64) - 1
+        file_a = 0x0101010101010101
+        file_h = 0x8080808080808080
+        rng = random.Random(7)
+        for _ in range(200):
+            occupancy = rng.getrandbits(64) & rng.getrandbits(64)
+            pawns = occupancy & rng.getrandbits(64)
+            enemy = occupancy & ~pawns & rng.getrandbits(64)
+
+            # All pawns of a color at once: shift by a row to push, by a row and a
+            # column to hit, and dash from the cells a push from the start row reaches
+            for white in (True, False):
+                if white:
+                    single = pawns << 8 & ~occupancy & full
+                    double = (single & 0xFF << 16) << 8 & ~occupancy
+                    hits = (pawns << 7 & ~file_h | pawns << 9 & ~file_a) & enemy
+                else:
+                    single = pawns >> 8 & ~occupancy
+                    double = (single & 0xFF << 40) >> 8 & ~occupancy
+                    hits = (pawns >> 9 & ~file_h | pawns >> 7 & ~file_a) & enemy
+
+                moves = 0
+                for sq in range(64):
+                    if pawns >> sq & 1:
+                        moves |= pawn_moves(sq, white, occupancy, enemy)
+
+                self.assertEqual(
+                    moves,
+                    single | double | hits & full,
+                    "pawn_moves must match the shifted pawn bitboards",
+                )
+
+    @colorize(color=RED)
+    def test_B13_valid_moves_match_pieces(self):
+        for _ in self.iterate_random_positions(13):
+            for white in (True, False):
+                self.assertEqual(
+                    self.board.valid_moves(white),
+                    [
+                        (piece, piece.get_valid_bb())
+                        for piece in self.board.iterate_cells_with_pieces(white)
+                    ],
+                    "board.valid_moves must match get_valid_bb of every piece",
+                )
+
+    @colorize(color=RED)
+    def test_B14_evaluate_matches_pieces(self):
+        for _ in self.iterate_random_positions(14):
+            # The board scores all pieces at once, it must agree with the pieces
+            expected = 0.0
+            for white in (True, False):
+                for piece in self.board.iterate_cells_with_pieces(white):
+                    value = piece.evaluate(use_heuristics=True)
+                    expected += value if white else -value
+
+            self.assertAlmostEqual(
+                self.board.evaluate(use_heuristics=True),
+                expected,
+                msg="board.evaluate must add up the evaluation of every piece",
+            )
+
     # ---------------------------------------------------------------------------
     # Phase C – Engine / MinMax-Einbindung
     # ---------------------------------------------------------------------------
@@ -657,6 +888,85 @@ class TestBoard(unittest.TestCase):
             "evaluate_all_possible_moves should respect requested amount of moves",
         )
 
+    @colorize(color=RED)
+    def test_C05_minmax_cached_tells_sides_apart(self):
+        self.board.load_from_disk("tests/random1.board")
+
+        clear_eval_cache()
+        blackMove = minMax_cached(self.board, MinMaxArg(depth=2, playAsWhite=False))
+
+        # A search for white of the very same position must not reuse blacks result
+        clear_eval_cache()
+        minMax_cached(self.board, MinMaxArg(depth=2, playAsWhite=True))
+        cachedMove = minMax_cached(self.board, MinMaxArg(depth=2, playAsWhite=False))
+
+        self.assertFalse(
+            cachedMove.piece.is_white(),
+            "minMax_cached must return a move of the side to move",
+        )
+        self.assertEqual(
+            blackMove.score,
+            cachedMove.score,
+            "minMax_cached must keep results of white and black apart",
+        )
+
+    @colorize(color=RED)
+    def test_C06_evaluate_all_possible_moves_ignores_earlier_searches(self):
+        def top_moves():
+            moves = evaluate_all_possible_moves(
+                self.board, minMaxArg=MinMaxArg(playAsWhite=False)
+            )
+            return [(move.piece.cell, move.cell) for move in moves]
+
+        # Every search leaves its killers and history behind, searches of
+        # different positions leave different ones
+        clear_eval_cache()
+        suggest_move(self.board)
+        before = top_moves()
+
+        other = Board()
+        other.load_from_disk("tests/random1.board")
+        clear_eval_cache()
+        suggest_move(other)
+
+        self.assertEqual(
+            before,
+            top_moves(),
+            "evaluate_all_possible_moves must not depend on earlier searches",
+        )
+
+    @colorize(color=RED)
+    def test_C07_parallel_root_search_hits_the_king(self):
+        self.board.load_from_memory(
+            """. . . . . . . K
+         . . . . . . . .
+         . . . p . . . .
+         . . . . . . . .
+         . b . R . q . .
+         . . . . . . . .
+         . . . k . . . .
+         . . . . . . . ."""
+        )
+
+        rootWorkers = engine.ROOT_WORKERS
+        engine.ROOT_WORKERS = 2
+        try:
+            clear_eval_cache()
+            move = suggest_move(self.board)
+        finally:
+            engine.ROOT_WORKERS = rootWorkers
+
+        self.assertTrue(
+            isinstance(self.board.get_cell(move.cell), King),
+            "The parallel root search should hit the black king in this case!\n\n"
+            + str(self.board),
+        )
+        self.assertEqual(
+            move.score,
+            engine.WIN_SCORE,
+            "Hitting the king must win the game in the parallel root search as well",
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
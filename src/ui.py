@@ -1,8 +1,9 @@
-import numpy as np
+from math import tanh
+
 import pygame
 
 from engine import suggest_move, suggest_random_move
-from pieces import Bishop, King, Knight, Pawn, Piece, Queen, Rook
+from pieces import PIECE_NAMES
 
 
 class UIState:
@@ -57,41 +58,36 @@ def load_sprites():
     }
 
 
+# Sprite tag of every (piece kind, color), indexed as KIND * 2 + white
+SPRITE_TAGS = tuple(
+    f"{name.upper()}_{color}" for name in PIECE_NAMES for color in ("BLACK", "WHITE")
+)
+
+
 def map_piece_to_sprite_tag(piece):
     if piece is None:
         return None
 
-    c = None
-    if isinstance(piece, Pawn):
-        c = "PAWN"
-    if isinstance(piece, Rook):
-        c = "ROOK"
-    if isinstance(piece, Knight):
-        c = "KNIGHT"
-    if isinstance(piece, Bishop):
-        c = "BISHOP"
-    if isinstance(piece, Queen):
-        c = "QUEEN"
-    if isinstance(piece, King):
-        c = "KING"
+    return SPRITE_TAGS[piece.KIND * 2 + piece.white]
 
-    if piece.is_white():
-        return c + "_WHITE"
 
-    return c + "_BLACK"
+def index_sprites(sprites):
+    """
+    Orders the sprites of load_sprites like SPRITE_TAGS, so drawing a piece needs no tag.
+    """
+    return [sprites[tag] for tag in SPRITE_TAGS]
 
 
-def draw_checker_pattern(screen, uiState):
+def render_checker_board():
+    """
+    Draws the static part of the window, the light background and the dark cells, onto a new surface.
+    It is drawn once and then copied onto the screen every frame.
+    """
     COLOR_WHITE = (240, 220, 190)
     COLOR_BLACK = (160, 110, 95)
 
-    screen.fill(COLOR_WHITE)
-
-    winChance = 1.0 / (1.0 + np.exp(-uiState.score / 8.0))
-
-    whiteRatio = 800 * winChance
-    pygame.draw.rect(screen, (255, 255, 255), (800, 800 - whiteRatio, 20, whiteRatio))
-    pygame.draw.rect(screen, (0, 0, 0), (800, 0, 20, 800 - whiteRatio))
+    background = pygame.Surface((820, 800))
+    background.fill(COLOR_WHITE)
 
     # Draw check board
     for row in range(8):
@@ -101,7 +97,21 @@ def draw_checker_pattern(screen, uiState):
 
             x = col * 100
             y = 700 - row * 100
-            pygame.draw.rect(screen, COLOR_BLACK, pygame.Rect(x, y, 100, 100))
+            pygame.draw.rect(background, COLOR_BLACK, pygame.Rect(x, y, 100, 100))
+
+    return background
+
+
+def draw_checker_pattern(screen, uiState, background):
+    screen.blit(background, (0, 0))
+
+    # Logistic of score / 8, written with tanh: exp would overflow on the score
+    # of a king hit
+    winChance = 0.5 + 0.5 * tanh(uiState.score / 16.0)
+
+    whiteRatio = 800 * winChance
+    pygame.draw.rect(screen, (255, 255, 255), (800, 800 - whiteRatio, 20, whiteRatio))
+    pygame.draw.rect(screen, (0, 0, 0), (800, 0, 20, 800 - whiteRatio))
 
     # Draw valid cells
     if uiState.valid_cells is not None:
@@ -136,16 +146,15 @@ def draw_checker_pattern(screen, uiState):
 
 
 def draw_board(screen, sprites, board):
-    for row in range(8):
-        for col in range(8):
-            piece = board.get_cell((row, col))
-            if piece is not None:
-                tag = map_piece_to_sprite_tag(piece)
-                sprite_to_draw = sprites[tag]
-
-                x = col * 100
-                y = 700 - row * 100
-                screen.blit(sprite_to_draw, (x, y - 5))
+    """
+    Draws all pieces on the board. sprites holds the surfaces as ordered by index_sprites.
+    """
+    for pieces in (board.white_pieces, board.black_pieces):
+        for piece in pieces:
+            row, col = piece.cell
+            x = col * 100
+            y = 700 - row * 100
+            screen.blit(sprites[piece.KIND * 2 + piece.white], (x, y - 5))
 
 
 def get_cell_under_mouse(uiState):
@@ -167,7 +176,8 @@ def run_game(board, manual=False):
     # Set up the game window
     screen = pygame.display.set_mode((820, 800))
 
-    sprites = load_sprites()
+    sprites = index_sprites(load_sprites())
+    background = render_checker_board()
 
     pygame.display.set_caption("Hello Pygame")
 
@@ -198,7 +208,7 @@ def run_game(board, manual=False):
 
             board.set_cell(nextMove.cell, nextMove.piece)
             uiState.score = nextMove.score
-            displayScore = np.tanh(uiState.score / 8.0) * 4.0
+            displayScore = tanh(uiState.score / 8.0) * 4.0
             print(f"Current Evaluation: {+displayScore:.2f}")
             whitesTurn = False
 
@@ -210,29 +220,29 @@ def run_game(board, manual=False):
                 piece = board.get_cell(uiState.mouse_over_cell)
                 if piece and piece.white == whitesTurn:
                     uiState.dragging = True
-                    uiState.valid_cells = piece.get_valid_cells()
+                    uiState.valid_cells = set(piece.get_valid_cells())
                     uiState.selected_cell = uiState.mouse_over_cell
 
             if event.type == pygame.MOUSEBUTTONUP and uiState.dragging:
                 uiState.dragging = False
 
-                if uiState.selected_cell != uiState.mouse_over_cell:
-                    for valid_cell in uiState.valid_cells:
-                        if (
-                            uiState.mouse_over_cell[0] == valid_cell[0]
-                            and uiState.mouse_over_cell[1] == valid_cell[1]
-                        ):
-                            piece = board.get_cell(uiState.selected_cell)
-                            piece.board.set_cell(uiState.mouse_over_cell, piece)
+                # Valid cells are a set of (row, col) tuples, dropping the piece
+                # outside the board (None) is no member either
+                if (
+                    uiState.selected_cell != uiState.mouse_over_cell
+                    and uiState.mouse_over_cell in uiState.valid_cells
+                ):
+                    piece = board.get_cell(uiState.selected_cell)
+                    piece.board.set_cell(uiState.mouse_over_cell, piece)
 
-                            # eval = board.evaluate()
-                            # print(f"White score: {eval:.4f}")
-                            nextMove = None
-                            whitesTurn = not whitesTurn
+                    # eval = board.evaluate()
+                    # print(f"White score: {eval:.4f}")
+                    nextMove = None
+                    whitesTurn = not whitesTurn
 
                 uiState.valid_cells = None
 
-        draw_checker_pattern(screen, uiState)
+        draw_checker_pattern(screen, uiState, background)
         draw_board(screen, sprites, board)
 
         uiState = get_cell_under_mouse(uiState)
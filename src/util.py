@@ -1,49 +1,21 @@
-from pieces import Bishop, King, Knight, Pawn, Queen, Rook
+from pieces import PIECE_CHARACTERS, PIECE_NAMES
+
+_PIECE_CHARACTERS = PIECE_CHARACTERS.decode()
 
 
 def map_piece_to_fullname(piece):
     if piece is None:
         return "<empty>"
 
-    c = None
-    if isinstance(piece, Pawn):
-        c = "Pawn"
-    if isinstance(piece, Rook):
-        c = "Rook"
-    if isinstance(piece, Knight):
-        c = "Knight"
-    if isinstance(piece, Bishop):
-        c = "Bishop"
-    if isinstance(piece, Queen):
-        c = "Queen"
-    if isinstance(piece, King):
-        c = "King"
-
-    return c
+    return PIECE_NAMES[piece.KIND]
 
 
 def map_piece_to_character(piece):
     if piece is None:
         return "."
 
-    c = None
-    if isinstance(piece, Pawn):
-        c = "P"
-    if isinstance(piece, Rook):
-        c = "R"
-    if isinstance(piece, Knight):
-        c = "N"
-    if isinstance(piece, Bishop):
-        c = "B"
-    if isinstance(piece, Queen):
-        c = "Q"
-    if isinstance(piece, King):
-        c = "K"
-
-    if piece.is_white():
-        return c
-
-    return c.lower()
+    # Table lookup by kind and color, white pieces are upper case
+    return _PIECE_CHARACTERS[piece.KIND * 2 + piece.white]
 
 
 def cell_to_string(cell):